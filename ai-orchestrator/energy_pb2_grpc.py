@@ -40,6 +40,11 @@ class EnergyServiceStub(object):
                 request_serializer=energy__pb2.EnergyRequest.SerializeToString,
                 response_deserializer=energy__pb2.EnergyResponse.FromString,
                 _registered_method=True)
+        self.ListEnergyData = channel.unary_unary(
+                '/energy.EnergyService/ListEnergyData',
+                request_serializer=energy__pb2.EnergyListRequest.SerializeToString,
+                response_deserializer=energy__pb2.EnergyList.FromString,
+                _registered_method=True)
 
 
 class EnergyServiceServicer(object):
@@ -52,6 +57,13 @@ class EnergyServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ListEnergyData(self, request, context):
+        """Tous les bâtiments (utilisé par la Gateway pour l'index géographique)
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_EnergyServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -60,6 +72,11 @@ def add_EnergyServiceServicer_to_server(servicer, server):
                     request_deserializer=energy__pb2.EnergyRequest.FromString,
                     response_serializer=energy__pb2.EnergyResponse.SerializeToString,
             ),
+            'ListEnergyData': grpc.unary_unary_rpc_method_handler(
+                    servicer.ListEnergyData,
+                    request_deserializer=energy__pb2.EnergyListRequest.FromString,
+                    response_serializer=energy__pb2.EnergyList.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'energy.EnergyService', rpc_method_handlers)
@@ -98,3 +115,30 @@ class EnergyService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def ListEnergyData(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/energy.EnergyService/ListEnergyData',
+            energy__pb2.EnergyListRequest.SerializeToString,
+            energy__pb2.EnergyList.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
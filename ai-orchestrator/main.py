@@ -1,8 +1,12 @@
+import argparse
+import os
 import sys
+import threading
 import time
 import grpc
 import requests
 from zeep import Client
+from zeep.transports import Transport
 
 # Import des fichiers gRPC
 try:
@@ -13,83 +17,149 @@ except ImportError:
     sys.exit(1)
 
 # --- CONFIGURATION DES PORTS ---
-SOAP_URL = 'http://localhost:8001/?wsdl'
-GRAPHQL_URL = 'http://localhost:5000/graphql'
-REST_URL = 'http://localhost:8002/transports'# L'adresse de ton service REST
-GRPC_HOST = '127.0.0.1:50051'
+SOAP_URL = os.getenv('SOAP_URL', 'http://localhost:8001/?wsdl')
+GRAPHQL_URL = os.getenv('GRAPHQL_URL', 'http://localhost:5000/graphql')
+REST_URL = os.getenv('REST_URL', 'http://localhost:8002/transports')  # L'adresse de ton service REST
+GRPC_HOST = os.getenv('GRPC_HOST', '127.0.0.1:50051')
+
+# Délai max (secondes) d'un appel à un service
+TIMEOUT = 5.0
 
 
 # --- 1. SOAP (Air) ---
+def soap_client(timeout=TIMEOUT):
+    """Télécharge le WSDL : à faire une fois, puis réutiliser le client."""
+    return Client(SOAP_URL, transport=Transport(timeout=timeout, operation_timeout=timeout))
+
+
+def fetch_air_soap(city, timeout=TIMEOUT, client=None):
+    client = client or soap_client(timeout)
+    res = client.service.get_air_quality(city=city)
+    return f"AQI: {res.aqi} | Status: {res.status}"
+
+
 def check_air_soap(city):
     print(f"\n☁️  [SOAP] Service Air ({city})...")
     try:
-        client = Client(SOAP_URL)
-        res = client.service.get_air_quality(city=city)
-        print(f"    ✅ AQI: {res.aqi} | Status: {res.status}")
+        print(f"    ✅ {fetch_air_soap(city)}")
     except Exception as e:
         print(f"    ❌ Erreur SOAP: {e}")
 
 
 # --- 2. GRAPHQL (Trafic) ---
+TRAFFIC_QUERY = """
+query($roadId: String!) {
+  getTraffic(roadId: $roadId) {
+    congestionLevel
+    averageSpeed
+  }
+}
+"""
+
+
+def fetch_traffic_graphql(road_id, timeout=TIMEOUT, session=requests):
+    res = session.post(GRAPHQL_URL, json={'query': TRAFFIC_QUERY, 'variables': {"roadId": road_id}},
+                        timeout=timeout)
+    if res.status_code != 200:
+        raise RuntimeError(f"HTTP {res.status_code}")
+    data = res.json().get('data', {}).get('getTraffic')
+    if not data:
+        return "Route inconnue"
+    return f"Vitesse: {data['averageSpeed']} km/h | État: {data['congestionLevel']}"
+
+
 def check_traffic_graphql(road_id):
     print(f"\n🚗  [GraphQL] Service Trafic ({road_id})...")
-    query = """
-    query($roadId: String!) {
-      getTraffic(roadId: $roadId) {
-        congestionLevel
-        averageSpeed
-      }
-    }
-    """
     try:
-        res = requests.post(GRAPHQL_URL, json={'query': query, 'variables': {"roadId": road_id}})
-        if res.status_code == 200:
-            data = res.json().get('data', {}).get('getTraffic')
-            if data:
-                print(f"    ✅ Vitesse: {data['averageSpeed']} km/h | État: {data['congestionLevel']}")
-        else:
-            print(f"    ❌ Erreur GraphQL: {res.status_code}")
+        print(f"    ✅ {fetch_traffic_graphql(road_id)}")
+    except RuntimeError as e:
+        print(f"    ❌ Erreur GraphQL: {e}")
     except Exception as e:
         print(f"    ❌ Erreur Connexion GraphQL: {e}")
 
 
 # --- 3. REST (Mobilité) ---
+def fetch_mobility_rest(destination, timeout=TIMEOUT, session=requests):
+    # On appelle l'URL REST.
+    # Si ton service attend un paramètre, adapte l'URL (ex: f"{REST_URL}/{destination}")
+    # Ici on fait un appel simple pour tester la connexion
+    res = session.get(REST_URL, timeout=timeout)
+    if res.status_code != 200:
+        raise RuntimeError(f"HTTP {res.status_code} (Vérifie que l'URL '{REST_URL}' est la bonne)")
+    # On suppose que le REST renvoie du JSON
+    try:
+        return f"Réponse REST : {res.json()}"
+    except ValueError:
+        return f"Réponse REST (Texte) : {res.text}"
+
+
 def check_mobility_rest(destination):
     print(f"\n🚲  [REST] Service Mobilité ({destination})...")
     try:
-        # On appelle l'URL REST.
-        # Si ton service attend un paramètre, adapte l'URL (ex: f"{REST_URL}/{destination}")
-        # Ici on fait un appel simple pour tester la connexion
-        res = requests.get(REST_URL)
-
-        if res.status_code == 200:
-            # On suppose que le REST renvoie du JSON
-            try:
-                data = res.json()
-                print(f"    ✅ Réponse REST : {data}")
-            except:
-                print(f"    ✅ Réponse REST (Texte) : {res.text}")
-        else:
-            print(f"    ⚠️  Service joint mais erreur HTTP {res.status_code}")
-            print(f"        (Vérifie que l'URL '{REST_URL}' est la bonne)")
+        print(f"    ✅ {fetch_mobility_rest(destination)}")
+    except RuntimeError as e:
+        print(f"    ⚠️  Service joint mais erreur {e}")
     except Exception as e:
         print(f"    ❌ Erreur Connexion REST: {e}")
 
 
 # --- 4. gRPC (Énergie) ---
+def fetch_energy_grpc(building_id, timeout=TIMEOUT, stub=None):
+    if stub is None:
+        with grpc.insecure_channel(GRPC_HOST) as channel:
+            return fetch_energy_grpc(building_id, timeout, energy_pb2_grpc.EnergyServiceStub(channel))
+    res = stub.GetEnergyData(energy_pb2.EnergyRequest(building_id=building_id), timeout=timeout)
+    return f"Conso: {res.consumption_kwh} kWh | Status: {res.status}"
+
+
 def check_energy_grpc(building_id):
     print(f"\n⚡  [gRPC] Service Énergie ({building_id})...")
     try:
-        with grpc.insecure_channel(GRPC_HOST) as channel:
-            stub = energy_pb2_grpc.EnergyServiceStub(channel)
-            res = stub.GetEnergyData(energy_pb2.EnergyRequest(building_id=building_id))
-            print(f"    ✅ Conso: {res.consumption_kwh} kWh | Status: {res.status}")
+        print(f"    ✅ {fetch_energy_grpc(building_id)}")
     except Exception as e:
         print(f"    ❌ Erreur gRPC: {e}")
 
 
-# --- Lancement ---
-if __name__ == "__main__":
+# --- 5. SONDES (mode --probe) ---
+class ProbeClients:
+    """Clients gardés d'une tournée à l'autre : client SOAP (WSDL lu une fois), canal gRPC et
+    session HTTP. Les latences mesurent l'appel au service, pas la création du client."""
+
+    def __init__(self, timeout=TIMEOUT):
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        self.channel = grpc.insecure_channel(GRPC_HOST)
+        self.energy_stub = energy_pb2_grpc.EnergyServiceStub(self.channel)
+        self.soap = None
+        # Mise en place hors mesure ; si un service est absent, on réessaie à la sonde suivante
+        try:
+            self.soap_client()
+            grpc.channel_ready_future(self.channel).result(timeout=timeout)
+        except Exception:
+            pass
+
+    def soap_client(self):
+        with self.lock:
+            if self.soap is None:
+                self.soap = soap_client(self.timeout)
+            return self.soap
+
+    def probes(self):
+        """Les sondes (nom du backend -> appel)."""
+        return {
+            "soap_air": lambda timeout: fetch_air_soap("Tunis", timeout, self.soap_client()),
+            "graphql_traffic": lambda timeout: fetch_traffic_graphql("GP9", timeout, self.session),
+            "rest_mobility": lambda timeout: fetch_mobility_rest("Centre-Ville", timeout, self.session),
+            "grpc_energy": lambda timeout: fetch_energy_grpc("Batiment_A", timeout, self.energy_stub),
+        }
+
+    def close(self):
+        self.session.close()
+        self.channel.close()
+
+
+def diagnostic():
     print("==================================================")
     print("🤖  SMART CITY AI ORCHESTRATOR - TEST GLOBAL (4 SERVICES)")
     print("==================================================")
@@ -107,4 +177,34 @@ if __name__ == "__main__":
     check_energy_grpc("Batiment_A")
 
     print("\n==================================================")
-    print("🏁  FIN DU DIAGNOSTIC")
\ No newline at end of file
+    print("🏁  FIN DU DIAGNOSTIC")
+
+
+# --- Lancement ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Diagnostic des 4 services de la Smart City")
+    parser.add_argument("--probe", action="store_true",
+                        help="Mode sonde : appels concurrents, latences p50/p95/p99")
+    parser.add_argument("--interval", type=float, default=10.0,
+                        help="Secondes entre deux tournées de sondes (mode --probe)")
+    parser.add_argument("--count", type=int, default=1,
+                        help="Nombre de tournées, 0 = en continu (mode --probe)")
+    parser.add_argument("--format", choices=["json", "prometheus"], default="json",
+                        help="Format de sortie (mode --probe)")
+    parser.add_argument("--output", default=None,
+                        help="Fichier réécrit à chaque tournée (ex: textfile collector), sinon stdout")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT,
+                        help="Délai max d'un appel (secondes)")
+    args = parser.parse_args()
+
+    if args.probe:
+        from probe import ProbeRunner
+
+        clients = ProbeClients(timeout=args.timeout)
+        runner = ProbeRunner(clients.probes(), timeout=args.timeout)
+        try:
+            runner.run(interval=args.interval, count=args.count, fmt=args.format, output=args.output)
+        finally:
+            clients.close()
+    else:
+        diagnostic()
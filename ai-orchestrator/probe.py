@@ -0,0 +1,165 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Bornes des seaux de l'histogramme (millisecondes), format Prometheus
+BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def percentile(sorted_values, q):
+    """Percentile (0-100) par interpolation linéaire sur une liste triée."""
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+class LatencyHistogram:
+    """Latences d'un backend : seaux cumulés (Prometheus) + fenêtre glissante (percentiles)."""
+
+    def __init__(self, window=10000):
+        self.lock = threading.Lock()
+        self.buckets = [0] * len(BUCKETS_MS)
+        self.window = deque(maxlen=window)
+        self.count = 0
+        self.sum_ms = 0.0
+        self.errors = 0
+        self.last_ok = None
+        self.last_error = None
+
+    def observe(self, latency_ms, ok, error=None):
+        with self.lock:
+            self.count += 1
+            self.sum_ms += latency_ms
+            self.window.append(latency_ms)
+            for i, bound in enumerate(BUCKETS_MS):
+                if latency_ms <= bound:
+                    self.buckets[i] += 1
+            self.last_ok = ok
+            if not ok:
+                self.errors += 1
+                self.last_error = error
+
+    def summary(self):
+        with self.lock:
+            values = sorted(self.window)
+            return {
+                "count": self.count,
+                "errors": self.errors,
+                "up": self.last_ok,
+                "last_error": self.last_error,
+                "p50_ms": percentile(values, 50),
+                "p95_ms": percentile(values, 95),
+                "p99_ms": percentile(values, 99),
+                "mean_ms": self.sum_ms / self.count if self.count else None,
+            }
+
+
+class ProbeRunner:
+    """Lance toutes les sondes en parallèle, à intervalle fixe, et agrège les latences."""
+
+    def __init__(self, probes, timeout=5.0):
+        self.probes = probes
+        self.timeout = timeout
+        self.histograms = {name: LatencyHistogram() for name in probes}
+        self.pool = ThreadPoolExecutor(max_workers=len(probes))
+        self.rounds = 0
+
+    def _probe(self, name):
+        start = time.perf_counter()
+        try:
+            self.probes[name](self.timeout)
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e)
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.histograms[name].observe(latency_ms, ok, error)
+        return name, ok, latency_ms, error
+
+    def run_round(self):
+        """Une tournée : toutes les sondes en même temps, résultat par backend."""
+        results = list(self.pool.map(self._probe, self.probes))
+        self.rounds += 1
+        return {name: {"ok": ok, "latency_ms": round(ms, 3), "error": error}
+                for name, ok, ms, error in results}
+
+    def to_json(self, last_round):
+        return json.dumps({
+            "timestamp": time.time(),
+            "round": self.rounds,
+            "last_round": last_round,
+            "backends": {name: h.summary() for name, h in self.histograms.items()},
+        }, ensure_ascii=False)
+
+    def to_prometheus(self):
+        lines = [
+            "# HELP smartcity_probe_up 1 si la dernière sonde du backend a réussi.",
+            "# TYPE smartcity_probe_up gauge",
+        ]
+        for name, h in self.histograms.items():
+            lines.append(f'smartcity_probe_up{{backend="{name}"}} {1 if h.last_ok else 0}')
+
+        lines += [
+            "# HELP smartcity_probe_errors_total Sondes en échec par backend.",
+            "# TYPE smartcity_probe_errors_total counter",
+        ]
+        for name, h in self.histograms.items():
+            lines.append(f'smartcity_probe_errors_total{{backend="{name}"}} {h.errors}')
+
+        lines += [
+            "# HELP smartcity_probe_latency_ms Latence des sondes par backend (ms).",
+            "# TYPE smartcity_probe_latency_ms histogram",
+        ]
+        for name, h in self.histograms.items():
+            with h.lock:
+                for bound, n in zip(BUCKETS_MS, h.buckets):
+                    lines.append(f'smartcity_probe_latency_ms_bucket{{backend="{name}",le="{bound}"}} {n}')
+                lines.append(f'smartcity_probe_latency_ms_bucket{{backend="{name}",le="+Inf"}} {h.count}')
+                lines.append(f'smartcity_probe_latency_ms_sum{{backend="{name}"}} {h.sum_ms:.3f}')
+                lines.append(f'smartcity_probe_latency_ms_count{{backend="{name}"}} {h.count}')
+
+        lines += [
+            "# HELP smartcity_probe_latency_quantile_ms Percentiles sur la fenêtre glissante (ms).",
+            "# TYPE smartcity_probe_latency_quantile_ms gauge",
+        ]
+        for name, h in self.histograms.items():
+            summary = h.summary()
+            for q in ("p50", "p95", "p99"):
+                if summary[f"{q}_ms"] is not None:
+                    lines.append(f'smartcity_probe_latency_quantile_ms{{backend="{name}",quantile="0.{q[1:]}"}} '
+                                 f'{summary[f"{q}_ms"]:.3f}')
+        return "\n".join(lines) + "\n"
+
+    def emit(self, text, output):
+        if output is None:
+            sys.stdout.write(text if text.endswith("\n") else text + "\n")
+            sys.stdout.flush()
+            return
+        # Écriture atomique : le lecteur ne voit jamais un fichier à moitié écrit
+        tmp = f"{output}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, output)
+
+    def run(self, interval=10.0, count=1, fmt="json", output=None):
+        """count=0 : boucle infinie. Le rythme est fixe (pas de dérive due à la durée des sondes)."""
+        next_round = time.monotonic()
+        try:
+            while True:
+                last_round = self.run_round()
+                self.emit(self.to_json(last_round) if fmt == "json" else self.to_prometheus(), output)
+                if count and self.rounds >= count:
+                    break
+                next_round += interval
+                time.sleep(max(0.0, next_round - time.monotonic()))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.pool.shutdown(wait=False)
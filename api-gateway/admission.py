@@ -0,0 +1,148 @@
+"""Contrôle d'admission devant l'IA (un seul modèle local, vite saturé).
+
+Au plus max_in_flight générations en même temps. Les suivantes attendent dans
+une file bornée, servies par priorité (0 = la plus haute) puis par ordre
+d'arrivée. Chacune a une échéance : si elle n'a pas obtenu de place à temps,
+ou si la file est pleine, on lève Busy et l'appelant répond sans l'IA.
+
+    LLM_GATE = AdmissionController("llm", max_in_flight=2, max_queue=16)
+    with LLM_GATE.slot(priority=0, timeout=10):
+        ...
+"""
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+CONTROLLERS = {}
+
+QUEUE_WAIT = metrics.Histogram("smartcity_admission_wait_seconds", "Attente dans la file avant d'être servi.",
+                               ["gate"])
+REJECTED = metrics.Counter("smartcity_admission_rejected_total",
+                           "Demandes refusées (file pleine ou échéance dépassée).", ["gate", "reason"])
+metrics.gauge_function("smartcity_admission_queue_depth", "Demandes en attente dans la file.",
+                       lambda: {(name, ): len(c.queue) for name, c in CONTROLLERS.items()}, ["gate"])
+metrics.gauge_function("smartcity_admission_in_flight", "Demandes en cours de traitement.",
+                       lambda: {(name, ): c.in_flight for name, c in CONTROLLERS.items()}, ["gate"])
+
+
+class Busy(Exception):
+    """Pas de place avant l'échéance (ou file pleine)."""
+
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class AdmissionController:
+    """store partagé (sharedcache.FileStore, plusieurs workers) : max_in_flight et max_queue
+    valent pour l'ensemble des workers. La priorité n'est respectée qu'au sein d'un worker."""
+
+    def __init__(self, name, max_in_flight, max_queue, store=None):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.queue = []  # tas de (priorité, n° d'arrivée, _Waiter)
+        self.seq = itertools.count()
+        # Places et tickets de file communs aux workers (verrous de fichiers)
+        shared = store is not None and store.shared
+        self.slots = store.semaphore(f"admission-{name}-slot", max_in_flight) if shared else None
+        self.tickets = store.semaphore(f"admission-{name}-queue", max_queue) if shared else None
+        CONTROLLERS[name] = self
+
+    def _reject(self, reason, message):
+        REJECTED.labels(self.name, reason).inc()
+        raise Busy(message)
+
+    def _ticket(self):
+        """Place dans la file commune aux workers (rien à prendre avec un seul processus)."""
+        if self.tickets is None:
+            return None
+        ticket = self.tickets.try_acquire()
+        if ticket is None:
+            self._reject("queue_full", f"{self.name} : file pleine ({self.max_queue} en attente, tous workers)")
+        return ticket
+
+    def _wait_local(self, priority, timeout, deadline):
+        """Attend une place dans ce processus (par priorité puis ordre d'arrivée)."""
+        with self.lock:
+            if self.in_flight < self.max_in_flight and not self.queue:
+                self.in_flight += 1
+                return
+            if len(self.queue) >= self.max_queue:
+                self._reject("queue_full", f"{self.name} : file pleine ({self.max_queue} en attente)")
+            waiter = _Waiter()
+            heapq.heappush(self.queue, (priority, next(self.seq), waiter))
+
+        waiter.event.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        with self.lock:
+            if not waiter.granted:
+                # Échéance dépassée : on quitte la file
+                self.queue = [entry for entry in self.queue if entry[2] is not waiter]
+                heapq.heapify(self.queue)
+                self._reject("deadline", f"{self.name} : pas de place après {timeout} s")
+
+    def _release_local(self):
+        with self.lock:
+            if self.queue:
+                # La place passe directement au suivant : in_flight ne bouge pas
+                _, _, waiter = heapq.heappop(self.queue)
+                waiter.granted = True
+                waiter.event.set()
+                return
+            self.in_flight -= 1
+
+    def acquire(self, priority=0, timeout=None):
+        """Attend une place ; renvoie le jeton à rendre à release()."""
+        start = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        ticket = None
+        try:
+            with self.lock:
+                immediate = self.in_flight < self.max_in_flight and not self.queue
+                if immediate:
+                    self.in_flight += 1
+            if not immediate:
+                # Toute attente occupe un ticket de la file commune
+                ticket = self._ticket()
+                self._wait_local(priority, timeout, deadline)
+            token = None
+            if self.slots is not None:
+                try:
+                    token = self.slots.try_acquire()
+                    if token is None:
+                        # Place libre ici mais prise par un autre worker : on attend dans la file commune
+                        ticket = ticket if ticket is not None else self._ticket()
+                        token = self.slots.acquire(deadline)
+                        if token is None:
+                            self._reject("deadline", f"{self.name} : pas de place après {timeout} s (tous workers)")
+                except BaseException:
+                    self._release_local()
+                    raise
+        finally:
+            if ticket is not None:
+                self.tickets.release(ticket)
+        QUEUE_WAIT.labels(self.name).observe(time.perf_counter() - start)
+        return token
+
+    def release(self, token=None):
+        if token is not None:
+            self.slots.release(token)
+        self._release_local()
+
+    @contextmanager
+    def slot(self, priority=0, timeout=None):
+        token = self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release(token)
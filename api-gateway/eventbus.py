@@ -0,0 +1,379 @@
+"""Bus d'événements capteurs (publish/subscribe) entre les services et la Gateway.
+
+Copie identique dans chaque service (comme tracing.py), sans dépendance externe.
+Chaque service publie les mises à jour de ses capteurs sur un sujet
+("sensor.air", "sensor.traffic", ...) ; la Gateway s'abonne et met sa photo de
+la ville à jour au fil de l'eau au lieu d'interroger les services.
+
+    BUS = eventbus.open_bus("service-soap-air")
+    BUS.keep_alive("sensor.air")
+    BUS.publish("sensor.air", "Tunis", {"aqi": 60, ...})  # payload None = capteur supprimé
+    BUS.subscribe("sensor.", on_events)                   # on_events(liste d'Event)
+
+Deux implémentations, même interface :
+    LocalBus   dans le processus (un seul processus, benchmark)
+    BrokerBus  via un petit broker TCP local (`python eventbus.py --port 7400`) qui
+               tient lieu de Redis / NATS : une ligne JSON = un lot d'événements.
+
+Les publications sont regroupées : un thread envoie le lot toutes les BATCH_MS ms
+(ou dès BATCH_MAX événements) en une seule écriture. keep_alive(sujet) ajoute un
+signe de vie (key None) toutes les HEARTBEAT_S secondes : l'abonné sait que ses
+données sont à jour même quand rien ne change.
+
+Chaque événement (signes de vie compris) porte le nom de l'éditeur et un numéro
+qui suit, par sujet, depuis son démarrage (publisher, seq). Un lot perdu (broker
+injoignable deux fois de suite) laisse un trou dans la suite : l'abonné doit alors
+se resynchroniser au lieu de croire le signe de vie suivant (voir SeqTracker).
+
+Configuration par variables d'environnement :
+    EVENT_BUS_URL         tcp://hôte:port du broker (vide = bus local au processus, défaut)
+    EVENT_BATCH_MS        attente max avant l'envoi d'un lot (défaut : 5)
+    EVENT_BATCH_MAX       taille max d'un lot (défaut : 500)
+    EVENT_HEARTBEAT_S     intervalle des signes de vie (défaut : 2)
+    SENSOR_UPDATES_PER_S  capteurs simulés : mises à jour par seconde (défaut : 0 = aucune)
+"""
+import argparse
+import asyncio
+import atexit
+import json
+import os
+import socket
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+BUS_URL = os.getenv('EVENT_BUS_URL', '')
+BATCH_MS = float(os.getenv('EVENT_BATCH_MS', '5'))
+BATCH_MAX = int(os.getenv('EVENT_BATCH_MAX', '500'))
+HEARTBEAT_S = float(os.getenv('EVENT_HEARTBEAT_S', '2'))
+SIMULATION_RATE = float(os.getenv('SENSOR_UPDATES_PER_S', '0'))
+
+DEFAULT_PORT = 7400
+
+# key None : signe de vie du service ; payload None : capteur supprimé
+# publisher : "nom#instance" de l'éditeur ; seq : numéro de l'événement sur ce sujet (1, 2, ...)
+Event = namedtuple("Event", "topic key payload published_at publisher seq")
+
+
+def _encode(obj):
+    return (json.dumps(obj, separators=(",", ":"), ensure_ascii=False) + "\n").encode()
+
+
+# --- 1. PUBLICATION PAR LOTS (commune aux deux bus) ---
+class _Bus:
+    def __init__(self, name, batch_ms=BATCH_MS, batch_max=BATCH_MAX, heartbeat_s=HEARTBEAT_S):
+        self.name = name
+        # Instance : un service redémarré repart de seq 1 sous un autre identifiant
+        self.publisher = f"{name}#{os.urandom(4).hex()}"
+        self.seqs = {}  # sujet -> dernier numéro publié
+        self.batch_s = batch_ms / 1000.0
+        self.batch_max = max(1, batch_max)
+        self.heartbeat_s = heartbeat_s
+        self.pending = []
+        self.alive_topics = set()
+        self.subscribers = []  # (préfixe du sujet, callback)
+        self.cond = threading.Condition()
+        self.send_lock = threading.Lock()  # Un lot à la fois, dans l'ordre
+        self.flusher = None
+        self.published = 0
+        self.batches = 0
+        self.dropped = 0
+        atexit.register(self._flush_at_exit)
+
+    def _event(self, topic, key, payload):
+        """Nouvel événement numéroté (appelé sous self.cond : numéros dans l'ordre d'envoi)."""
+        seq = self.seqs[topic] = self.seqs.get(topic, 0) + 1
+        return Event(topic, key, payload, time.time(), self.publisher, seq)
+
+    def publish(self, topic, key, payload):
+        with self.cond:
+            self.pending.append(self._event(topic, key, payload))
+            self.published += 1
+            self._ensure_flusher()
+            # Réveille le thread au premier événement (début du lot) et quand le lot est plein
+            if len(self.pending) == 1 or len(self.pending) >= self.batch_max:
+                self.cond.notify()
+
+    def keep_alive(self, topic):
+        with self.cond:
+            self.alive_topics.add(topic)
+            self._ensure_flusher()
+            self.cond.notify()
+
+    def subscribe(self, prefix, callback):
+        """callback(events) reçoit les événements dont le sujet commence par prefix, par lots."""
+        self.subscribers.append((prefix, callback))
+
+    def flush(self):
+        """Envoie tout de suite les événements en attente, par lots d'au plus batch_max."""
+        with self.send_lock:
+            with self.cond:
+                pending, self.pending = self.pending, []
+            for i in range(0, len(pending), self.batch_max):
+                self.batches += 1
+                self._send(pending[i:i + self.batch_max])
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def _ensure_flusher(self):
+        if self.flusher is None:
+            self.flusher = threading.Thread(target=self._flush_loop, daemon=True, name=f"{self.name}-events")
+            self.flusher.start()
+
+    def _flush_loop(self):
+        next_beat = time.monotonic()
+        while True:
+            with self.cond:
+                if not self.pending:
+                    timeout = max(0.0, next_beat - time.monotonic()) if self.alive_topics else None
+                    self.cond.wait(timeout)
+                if self.pending and len(self.pending) < self.batch_max:
+                    # Le lot a commencé : on le laisse se remplir au plus batch_s
+                    self.cond.wait(self.batch_s)
+                if self.alive_topics and time.monotonic() >= next_beat:
+                    # Dans la file, après les événements déjà numérotés
+                    self.pending.extend(self._event(topic, None, None) for topic in sorted(self.alive_topics))
+                    next_beat = time.monotonic() + self.heartbeat_s
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"⚠️ Bus d'événements ({self.name}) : envoi impossible ({e})")
+
+    def _dispatch(self, events):
+        for prefix, callback in self.subscribers:
+            selected = [e for e in events if e.topic.startswith(prefix)]
+            if not selected:
+                continue
+            try:
+                callback(selected)
+            except Exception as e:
+                print(f"⚠️ Bus d'événements ({self.name}) : abonné '{prefix}' en échec ({e})")
+
+    def _send(self, batch):
+        raise NotImplementedError
+
+
+class LocalBus(_Bus):
+    """Abonnés dans le même processus : le lot leur est remis par le thread d'envoi."""
+    remote = False
+
+    def _send(self, batch):
+        self._dispatch(batch)
+
+
+# --- 2. CLIENT DU BROKER ---
+class BrokerBus(_Bus):
+    """Une connexion pour publier, une autre (et un thread lecteur) pour les abonnements.
+
+    Si le broker redémarre, le lecteur se reconnecte tout seul et appelle les fonctions
+    passées à on_reconnect (les événements manqués entre-temps sont perdus : à l'abonné
+    de se resynchroniser).
+    """
+    remote = True
+
+    def __init__(self, name, host, port, **kwargs):
+        super().__init__(name, **kwargs)
+        self.address = (host, port)
+        self.sock = None
+        self.sub_sock = None
+        self.sub_lock = threading.Lock()
+        self.reader = None
+        self.connected = False
+        self.closed = False
+        self.reconnect_callbacks = []
+
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=5)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def _send(self, batch):
+        data = _encode({"pub": [list(e) for e in batch]})
+        # Une nouvelle tentative sur une connexion neuve (broker redémarré), puis on abandonne le lot
+        for attempt in range(2):
+            try:
+                if self.sock is None:
+                    self.sock = self._connect()
+                self.sock.sendall(data)
+                return
+            except OSError as e:
+                if self.sock is not None:
+                    self.sock.close()
+                    self.sock = None
+                if attempt:
+                    self.dropped += len(batch)
+                    raise e
+
+    def subscribe(self, prefix, callback):
+        super().subscribe(prefix, callback)
+        with self.sub_lock:
+            if self.sub_sock is not None:
+                try:
+                    self.sub_sock.sendall(_encode({"sub": [prefix]}))
+                except OSError:
+                    pass  # Le lecteur se reconnecte et renvoie tous les préfixes
+            if self.reader is None:
+                self.reader = threading.Thread(target=self._read_loop, daemon=True, name=f"{self.name}-subscriber")
+                self.reader.start()
+
+    def on_reconnect(self, callback):
+        self.reconnect_callbacks.append(callback)
+
+    def close(self):
+        """Coupe les connexions (le lecteur s'arrête au lieu de se reconnecter)."""
+        self.closed = True
+        with self.sub_lock:
+            for sock in (self.sock, self.sub_sock):
+                if sock is not None:
+                    try:
+                        sock.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+                    sock.close()
+            self.sock = self.sub_sock = None
+
+    def _read_loop(self):
+        delay, first = 0.5, True
+        while not self.closed:
+            try:
+                sock = self._connect()
+                sock.settimeout(None)
+                with self.sub_lock:
+                    sock.sendall(_encode({"sub": [prefix for prefix, _ in self.subscribers]}))
+                    self.sub_sock = sock
+                self.connected, delay = True, 0.5
+                print(f"📡 Bus d'événements ({self.name}) : abonné via {self.address[0]}:{self.address[1]}")
+                if not first:
+                    for callback in self.reconnect_callbacks:
+                        callback()
+                first = False
+                with sock.makefile("r", encoding="utf-8") as lines:
+                    for line in lines:
+                        self._dispatch([Event(*e) for e in json.loads(line)])
+            except (OSError, ValueError) as e:
+                if self.closed:
+                    break
+                print(f"⚠️ Bus d'événements ({self.name}) : broker injoignable ({e}), nouvel essai dans {delay:.1f} s")
+            self.connected = False
+            with self.sub_lock:
+                self.sub_sock = None
+            time.sleep(delay)
+            delay = min(delay * 2, 5.0)
+
+
+class SeqTracker:
+    """Côté abonné : repère les événements manqués d'après (publisher, seq).
+
+    check(event) renvoie None si l'événement suit le précédent de son éditeur sur ce
+    sujet (ou si l'éditeur est vu pour la première fois), sinon la raison du trou.
+    """
+
+    def __init__(self):
+        self.last = {}  # (nom de l'éditeur, sujet) -> (instance, dernier seq)
+
+    def check(self, event):
+        name, _, instance = event.publisher.rpartition("#")
+        previous = self.last.get((name, event.topic))
+        if previous is not None and previous[0] == instance and event.seq <= previous[1]:
+            return None  # Lot renvoyé deux fois : déjà vu
+        self.last[(name, event.topic)] = (instance, event.seq)
+        if previous is None:
+            return None
+        if previous[0] != instance:
+            return f"{name} a redémarré"
+        if event.seq != previous[1] + 1:
+            return f"{event.seq - previous[1] - 1} événement(s) {event.topic} de {name} perdu(s)"
+        return None
+
+
+def open_bus(name):
+    if not BUS_URL:
+        return LocalBus(name)
+    url = urlparse(BUS_URL)
+    return BrokerBus(name, url.hostname or "127.0.0.1", url.port or DEFAULT_PORT)
+
+
+def simulate(update, rate=SIMULATION_RATE):
+    """Appelle update() rate fois par seconde dans un thread (capteurs simulés ; 0 = rien)."""
+    if rate <= 0:
+        return
+
+    def loop():
+        next_run = time.monotonic()
+        while True:
+            next_run += 1.0 / rate
+            time.sleep(max(0.0, next_run - time.monotonic()))
+            try:
+                update()
+            except Exception as e:
+                print(f"⚠️ Capteur simulé en échec ({e})")
+
+    threading.Thread(target=loop, daemon=True, name="sensor-simulation").start()
+
+
+# --- 3. BROKER LOCAL (en attendant Redis / NATS) ---
+class Broker:
+    """Reçoit des lots {"pub": [...]} et renvoie à chaque abonné ceux qui l'intéressent.
+
+    Un abonné trop lent (plus de MAX_BUFFER octets en attente) est déconnecté : il se
+    reconnectera et se resynchronisera, plutôt que de faire grossir la mémoire du broker.
+    """
+    MAX_BUFFER = 8 * 1024 * 1024
+
+    def __init__(self):
+        self.subscribers = {}  # writer -> tuple de préfixes
+        self.events = 0
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                if "sub" in msg:
+                    self.subscribers[writer] = self.subscribers.get(writer, ()) + tuple(msg["sub"])
+                if "pub" in msg:
+                    self.route(msg["pub"])
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+    def route(self, events):
+        self.events += len(events)
+        encoded = {}  # Un seul encodage par ensemble de préfixes
+        for writer, prefixes in list(self.subscribers.items()):
+            if writer.transport.get_write_buffer_size() > self.MAX_BUFFER:
+                print("⚠️ Abonné trop lent : déconnecté")
+                self.subscribers.pop(writer, None)
+                writer.close()
+                continue
+            if prefixes not in encoded:
+                selected = [e for e in events if e[0].startswith(prefixes)]
+                encoded[prefixes] = _encode(selected) if selected else None
+            if encoded[prefixes]:
+                writer.write(encoded[prefixes])
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port, limit=16 * 1024 * 1024)
+        print(f"📡 Broker d'événements sur tcp://{host}:{port}")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Broker local du bus d'événements capteurs")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(Broker().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,153 @@
+import math
+
+# Rayon moyen de la Terre (km)
+EARTH_RADIUS_KM = 6371.0088
+
+# Longueur d'un degré de latitude (km)
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180.0
+
+
+# --- 1. GAZETTEER : QUARTIERS DU GRAND TUNIS -> COORDONNÉES ---
+# La clé est le texte cherché dans la question de l'utilisateur (en minuscules)
+PLACES = {
+    # Banlieue Nord
+    "marsa": (36.8782, 10.3247), "carthage": (36.8528, 10.3233), "goulette": (36.8181, 10.3050),
+    "aouina": (36.8530, 10.2550), "sidi bou": (36.8687, 10.3416), "gammarth": (36.9180, 10.2870),
+    # Lac
+    "lac": (36.8350, 10.2450), "kram": (36.8333, 10.3167),
+    # Ariana / Menzah / Ennasr
+    "ariana": (36.8625, 10.1956), "ennasr": (36.8570, 10.1650), "menzah": (36.8400, 10.1800),
+    "ghazela": (36.8950, 10.1870),
+    # Bardo / Manouba
+    "bardo": (36.8092, 10.1406), "manouba": (36.8081, 10.1011), "campus": (36.8380, 10.1490),
+    "manar": (36.8400, 10.1600),
+    # Banlieue Sud
+    "mourouj": (36.7300, 10.2100), "rades": (36.7681, 10.2753), "ezzahra": (36.7439, 10.3083),
+    "hammam lif": (36.7297, 10.3411), "ben arous": (36.7531, 10.2189),
+    # Centre
+    "centre": (36.8008, 10.1800), "tunis": (36.8008, 10.1800), "passage": (36.8070, 10.1750),
+}
+
+
+def find_places(text):
+    """Renvoie les quartiers cités dans le texte, dans l'ordre du gazetteer."""
+    text = text.lower()
+    return [place for place in PLACES if place in text]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance orthodromique entre deux points (km)."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# --- 2. INDEX SPATIAL (GRILLE UNIFORME) ---
+class SpatialIndex:
+    """Grille régulière en degrés : chaque cellule contient les points qui y tombent.
+
+    Les requêtes ne parcourent que les cellules voisines du point demandé, ce qui
+    reste en dessous de la milliseconde pour quelques milliers de capteurs.
+    """
+
+    def __init__(self, cell_deg=0.01):
+        self.cell_deg = cell_deg
+        self.cells = {}
+        self.points = {}  # clé -> (lat, lon, payload)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell(self, lat, lon):
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def insert(self, key, lat, lon, payload=None):
+        if key in self.points:
+            self.remove(key)
+        self.points[key] = (lat, lon, payload)
+        self.cells.setdefault(self._cell(lat, lon), []).append(key)
+
+    def remove(self, key):
+        lat, lon, _ = self.points.pop(key)
+        cell = self._cell(lat, lon)
+        keys = self.cells[cell]
+        keys.remove(key)
+        if not keys:
+            del self.cells[cell]
+
+    def _hit(self, key, lat, lon):
+        p_lat, p_lon, payload = self.points[key]
+        return haversine_km(lat, lon, p_lat, p_lon), key, payload
+
+    def _ring_km(self, lat, ring):
+        """Borne basse (km) de la distance entre le point et l'anneau suivant."""
+        far_lat = min(abs(lat) + (ring + 1) * self.cell_deg, 89.0)
+        return ring * self.cell_deg * KM_PER_DEG * math.cos(math.radians(far_lat))
+
+    def _ring_cells(self, ci, cj, ring):
+        if ring == 0:
+            yield ci, cj
+            return
+        for j in range(cj - ring, cj + ring + 1):
+            yield ci - ring, j
+            yield ci + ring, j
+        for i in range(ci - ring + 1, ci + ring):
+            yield i, cj - ring
+            yield i, cj + ring
+
+    def nearest(self, lat, lon, k=1, max_km=None):
+        """Les k points les plus proches : liste de (distance_km, clé, payload)."""
+        if not self.points or k <= 0:
+            return []
+
+        ci, cj = self._cell(lat, lon)
+        hits = []
+        ring = 0
+        while True:
+            # Anneau plus grand que la grille occupée : on balaie tout directement
+            if 8 * ring > len(self.cells):
+                hits = [self._hit(key, lat, lon) for key in self.points]
+                break
+
+            for cell in self._ring_cells(ci, cj, ring):
+                for key in self.cells.get(cell, ()):
+                    hits.append(self._hit(key, lat, lon))
+
+            # Tout point d'un anneau plus lointain est au-delà de _ring_km
+            bound = self._ring_km(lat, ring)
+            if len(hits) >= k:
+                hits.sort(key=lambda h: h[0])
+                if hits[k - 1][0] <= bound:
+                    break
+            if max_km is not None and bound > max_km:
+                break
+            ring += 1
+
+        hits.sort(key=lambda h: h[0])
+        if max_km is not None:
+            hits = [h for h in hits if h[0] <= max_km]
+        return hits[:k]
+
+    def within(self, lat, lon, radius_km):
+        """Tous les points à moins de radius_km, triés par distance."""
+        d_lat = radius_km / KM_PER_DEG
+        d_lon = radius_km / (KM_PER_DEG * max(math.cos(math.radians(abs(lat) + d_lat)), 0.01))
+        i0, j0 = self._cell(lat - d_lat, lon - d_lon)
+        i1, j1 = self._cell(lat + d_lat, lon + d_lon)
+
+        # Boîte plus grande que la grille occupée : on ne parcourt que les cellules non vides
+        if (i1 - i0 + 1) * (j1 - j0 + 1) > len(self.cells):
+            cells = [cell for cell in self.cells if i0 <= cell[0] <= i1 and j0 <= cell[1] <= j1]
+        else:
+            cells = [(i, j) for i in range(i0, i1 + 1) for j in range(j0, j1 + 1)]
+
+        hits = []
+        for cell in cells:
+            for key in self.cells.get(cell, ()):
+                hit = self._hit(key, lat, lon)
+                if hit[0] <= radius_km:
+                    hits.append(hit)
+        hits.sort(key=lambda h: h[0])
+        return hits
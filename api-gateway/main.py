@@ -1,20 +1,36 @@
-from fastapi import FastAPI, HTTPException
+import startup  # En premier : chronomètre les imports qui suivent
+
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
+from typing import List
 import requests
-from zeep import Client
-import grpc
-import sys
 import os
+import contextvars
+import hashlib
 import json
-
-# Import gRPC (Gestion d'erreur si les fichiers manquent)
-try:
-    import energy_pb2
-    import energy_pb2_grpc
-except ImportError:
-    print("❌ ERREUR : Copiez energy_pb2.py et energy_pb2_grpc.py dans ce dossier !")
-    sys.exit(1)
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+import admission
+import eventbus
+import metrics
+import prompt
+import resilience
+import sharedcache
+import tracing
+from geo import PLACES, find_places, haversine_km
+from snapshot import SnapshotRefresher
+
+# zeep (+ lxml), grpc et les fichiers energy_pb2 / bulk_pb2 sont importés au premier usage
+# (ou pendant la chauffe, voir section 9) : le serveur démarre sans les attendre.
 
 # Création du serveur FastAPI
 app = FastAPI(
@@ -32,22 +48,116 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- MÉTRIQUES PROMETHEUS (GET /metrics) ---
+app.add_middleware(metrics.AsgiMiddleware)
+
+BACKEND_LATENCY = metrics.Histogram("smartcity_backend_request_duration_seconds",
+                                    "Durée des appels de la Gateway vers les microservices et l'IA.",
+                                    ["backend", "operation"])
+BACKEND_ERRORS = metrics.Counter("smartcity_backend_errors_total",
+                                 "Appels en échec vers les microservices et l'IA.", ["backend", "error"])
+CHAT_CONTEXT_ERRORS = metrics.Counter("smartcity_chat_context_errors_total",
+                                      "Données ignorées dans le contexte du chat suite à une erreur.", ["source"])
+CACHE_REQUESTS = metrics.Counter("smartcity_cache_requests_total", "Lectures de cache.", ["cache", "result"])
+EVENTS_RECEIVED = metrics.Counter("smartcity_events_received_total", "Événements capteurs reçus du bus.",
+                                  ["source", "type"])
+EVENT_GAPS = metrics.Counter("smartcity_event_gaps_total",
+                             "Événements manqués (trou dans la suite d'un service) : photo réinterrogée.", ["source"])
+EVENT_LAG = metrics.Histogram("smartcity_event_lag_seconds",
+                              "Délai entre la publication d'un changement et sa prise en compte.", ["source"])
+PROMPT_TOKENS = metrics.Histogram("smartcity_llm_prompt_tokens", "Taille estimée des prompts envoyés à l'IA (tokens).",
+                                  buckets=(64, 128, 256, 384, 512, 768, 1024, 2048, 4096))
+
+# --- TRAÇAGE (activé si TRACE_SAMPLE_RATE > 0) ---
+tracing.init("api-gateway")
+
+if tracing.enabled():
+    @app.middleware("http")
+    async def trace_requests(request, call_next):
+        span = tracing.server_span(f"{request.method} {request.url.path}", request.headers.get("traceparent"))
+        with span:
+            response = await call_next(request)
+            span.set("http.status_code", response.status_code)
+        if span.trace_id:
+            response.headers["X-Trace-Id"] = span.trace_id
+        return response
+
 # --- 2. ADRESSES DES MICROSERVICES ---
 SOAP_URL = os.getenv('SOAP_URL', 'http://localhost:8001/?wsdl')
 GRAPHQL_URL = os.getenv('GRAPHQL_URL', 'http://localhost:5000/graphql')
 REST_URL = os.getenv('REST_URL', 'http://localhost:8002/transports')
 GRPC_HOST = os.getenv('GRPC_HOST', '127.0.0.1:50051')
+# Exports en masse binaires (protobuf, voir bulk.proto) lus pour la photo de la ville au lieu
+# du XML SOAP / JSON GraphQL / JSON REST (BULK_EXPORT=0 : anciens formats)
+BULK_EXPORT = os.getenv('BULK_EXPORT', '1') == '1'
+SOAP_BULK_URL = os.getenv('SOAP_BULK_URL', urljoin(SOAP_URL, '/bulk/air'))
+GRAPHQL_BULK_URL = os.getenv('GRAPHQL_BULK_URL', urljoin(GRAPHQL_URL, '/bulk/traffic'))
+REST_BULK_URL = os.getenv('REST_BULK_URL', REST_URL.rstrip('/') + '/bulk')
 
 # --- ADRESSE DE L'INTELLIGENCE ARTIFICIELLE (OLLAMA) ---
 # IMPORTANT : On utilise ton IP Wi-Fi pour que Docker puisse sortir et parler à Windows
-OLLAMA_URL = "http://172.20.10.6:11434/api/generate"
-
-print(f"🔧 CONFIGURATION CHARGÉE :")
-print(f"   - SOAP : {SOAP_URL}")
-print(f"   - GQL  : {GRAPHQL_URL}")
-print(f"   - REST : {REST_URL}")
-print(f"   - gRPC : {GRPC_HOST}")
-print(f"   - AI   : {OLLAMA_URL}")
+OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://172.20.10.6:11434/api/generate')
+# Générations simultanées (à aligner sur OLLAMA_NUM_PARALLEL), taille de la file d'attente
+# et attente max dans la file avant de répondre sans l'IA
+LLM_MAX_IN_FLIGHT = int(os.getenv('LLM_MAX_IN_FLIGHT', '2'))
+# Une même question sur les mêmes données : réponse de l'IA réutilisée pendant LLM_ANSWER_TTL_S (0 = jamais)
+LLM_ANSWER_TTL_S = float(os.getenv('LLM_ANSWER_TTL_S', '30'))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '16'))
+LLM_QUEUE_TIMEOUT_S = float(os.getenv('LLM_QUEUE_TIMEOUT_S', '15'))
+# Nombre max de questions dans un appel à /api/chat/batch
+CHAT_BATCH_MAX = int(os.getenv('CHAT_BATCH_MAX', '64'))
+
+# --- PLUSIEURS WORKERS (uvicorn --workers) ---
+# Les workers partagent la photo de la ville et les réponses de l'IA via SHARED_CACHE_DIR
+# (créé automatiquement par `python main.py` si GATEWAY_WORKERS > 1). LLM_MAX_IN_FLIGHT et
+# LLM_MAX_QUEUE valent alors pour l'ensemble des workers (verrous de fichiers dans ce dossier).
+# Sans SHARED_CACHE_DIR, chaque processus a son cache et ses propres limites.
+GATEWAY_WORKERS = int(os.getenv('GATEWAY_WORKERS', '1'))
+STORE = sharedcache.open_store()
+
+# --- PHOTO DE LA VILLE (capteurs gardés en mémoire) ---
+# Rafraîchie en tâche de fond toutes les SNAPSHOT_INTERVAL_S secondes (0 = à la demande)
+SNAPSHOT_INTERVAL_S = float(os.getenv('SNAPSHOT_INTERVAL_S', '5'))
+# Au-delà de cet âge, une source est jugée périmée et on interroge le service en direct
+SNAPSHOT_MAX_AGE_S = float(os.getenv('SNAPSHOT_MAX_AGE_S', '30'))
+# Avec le bus d'événements (EVENT_BUS_URL, voir eventbus.py), les services publient leurs
+# changements : la photo n'est plus réinterrogée en entier que toutes les EVENT_RESYNC_S
+# secondes (filet de sécurité) et à chaque reconnexion au broker.
+BUS = eventbus.open_bus("api-gateway")
+EVENT_RESYNC_S = float(os.getenv('EVENT_RESYNC_S', '300'))
+# Sans thread de fond : photo refaite toutes les GEO_INDEX_TTL secondes
+GEO_INDEX_TTL = float(os.getenv('GEO_INDEX_TTL', '300'))
+# Si un service manquait lors de la construction, on réessaie plus tôt
+GEO_INDEX_RETRY_S = float(os.getenv('GEO_INDEX_RETRY_S', '10'))
+# Taille max (tokens estimés) des données capteurs envoyées à l'IA
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '300'))
+# Horizon (minutes) des prévisions de trafic utilisées par le chat
+TRAFFIC_FORECAST_MIN = int(os.getenv('TRAFFIC_FORECAST_MIN', '60'))
+# Rayon (km) pour chercher les arrêts de transport autour d'un quartier
+NEARBY_RADIUS_KM = float(os.getenv('NEARBY_RADIUS_KM', '3'))
+# Bornes de /api/nearby (rayon en km, nombre de capteurs par type)
+NEARBY_MAX_RADIUS_KM = float(os.getenv('NEARBY_MAX_RADIUS_KM', '50'))
+NEARBY_MAX_K = int(os.getenv('NEARBY_MAX_K', '50'))
+
+def log_config():
+    print(f"🔧 CONFIGURATION CHARGÉE :")
+    print(f"   - SOAP : {SOAP_URL}")
+    print(f"   - GQL  : {GRAPHQL_URL}")
+    print(f"   - REST : {REST_URL}")
+    print(f"   - gRPC : {GRPC_HOST}")
+    print(f"   - Exports en masse : {'protobuf' if BULK_EXPORT else 'XML / JSON'}")
+    print(f"   - AI   : {OLLAMA_URL} ({LLM_MAX_IN_FLIGHT} en parallèle, file de {LLM_MAX_QUEUE})")
+    print(f"   - Workers : {GATEWAY_WORKERS} (cache {'partagé : ' + STORE.directory if STORE.shared else 'local'})")
+    if not STORE.shared and multiprocessing.parent_process() is not None:
+        # Ex: `uvicorn main:app --workers N` sans SHARED_CACHE_DIR
+        print("⚠️  Worker lancé par un autre processus sans SHARED_CACHE_DIR : si plusieurs workers tournent, "
+              "chacun a son cache et ses LLM_MAX_IN_FLIGHT générations (lancez `python main.py` avec "
+              "GATEWAY_WORKERS, ou définissez SHARED_CACHE_DIR)")
+    if BUS.remote:
+        print(f"   - Photo de la ville : événements via {eventbus.BUS_URL} (resynchronisée toutes les {EVENT_RESYNC_S} s)")
+    else:
+        print(f"   - Photo de la ville : {'toutes les ' + str(SNAPSHOT_INTERVAL_S) + ' s' if SNAPSHOT_INTERVAL_S > 0 else 'à la demande'}")
+    print(f"   - Traces : {'1 requête sur ' + str(round(1 / tracing.SAMPLE_RATE)) if tracing.enabled() else 'désactivées'}")
 
 
 # Modèle de données pour le Chat
@@ -55,38 +165,81 @@ class ChatRequest(BaseModel):
     question: str
 
 
+# Sans indentation : chaque espace du prompt coûte des tokens à évaluer
+PROMPT_TEMPLATE = """Tu es l'assistant intelligent de Tunis (Smart City).
+Voici les données techniques actuelles :
+{context}
+
+L'utilisateur demande : "{question}"
+
+Réponds-lui de manière naturelle, utile et brève (en français).
+Si les données indiquent un problème (bouchon, retard), préviens l'utilisateur.
+Base-toi UNIQUEMENT sur les données fournies."""
+
+
 # --- 3. FONCTION D'AIDE : PARLER A OLLAMA ---
-def ask_ollama(context, question):
-    # NOM EXACT DU MODÈLE (Celui de 'ollama list')
-    model_name = "llama3:latest"
+# File d'attente devant le modèle : au-delà, réponse immédiate avec les données brutes
+LLM_GATE = admission.AdmissionController("llm", LLM_MAX_IN_FLIGHT, LLM_MAX_QUEUE, STORE)
+
+
+def ask_ollama(context, question, priority=0):
+    """priority : 0 pour une question posée en direct, plus grand = moins urgent."""
+    cache_key = None
+    if LLM_ANSWER_TTL_S > 0:
+        # Le contexte contient les données : même clé = même question sur les mêmes données
+        cache_key = "llm-" + hashlib.sha1(f"{context}\n{question.strip().lower()}".encode()).hexdigest()
+        cached = STORE.get(cache_key, max_age=LLM_ANSWER_TTL_S)
+        CACHE_REQUESTS.labels("llm_answer", "hit" if cached is not None else "miss").inc()
+        if cached is not None:
+            return cached
+    try:
+        with LLM_GATE.slot(priority, timeout=LLM_QUEUE_TIMEOUT_S):
+            return generate(context, question, cache_key)
+    except admission.Busy as e:
+        print(f"⏳ IA saturée ({e}) : réponse avec les données brutes")
+        return "L'assistant est très sollicité en ce moment. Voici les données actuelles des capteurs :\n" + context
 
-    prompt = f"""
-    Tu es l'assistant intelligent de Tunis (Smart City).
-    Voici les données techniques actuelles : {context}
 
-    L'utilisateur demande : "{question}"
+def generate(context, question, cache_key=None):
+    # NOM EXACT DU MODÈLE (Celui de 'ollama list')
+    model_name = "llama3:latest"
 
-    Réponds-lui de manière naturelle, utile et brève (en français). 
-    Si les données indiquent un problème (bouchon, retard), préviens l'utilisateur.
-    Base-toi UNIQUEMENT sur les données fournies.
-    """
+    prompt_text = PROMPT_TEMPLATE.format(context=context, question=question)
+    prompt_tokens = prompt.estimate_tokens(prompt_text)
+    PROMPT_TOKENS.observe(prompt_tokens)
     try:
         data = {
             "model": model_name,
-            "prompt": prompt,
+            "prompt": prompt_text,
             "stream": False
         }
-        print(f"🧠 Envoi à Ollama ({OLLAMA_URL}) avec le modèle '{model_name}'...")
+        print(f"🧠 Envoi à Ollama ({OLLAMA_URL}) avec le modèle '{model_name}' : "
+              f"{len(prompt_text)} caractères (~{prompt_tokens} tokens)...")
 
         # AJOUT DU TIMEOUT (120 secondes) pour éviter que ça coupe si ton PC est lent
-        response = requests.post(OLLAMA_URL, json=data, timeout=120)
+        start = time.perf_counter()
+        with observe_backend("llm", "generate", model=model_name, prompt_chars=len(prompt_text)) as span:
+            response = requests.post(OLLAMA_URL, json=data, timeout=120)
+            if response.status_code != 200:
+                BACKEND_ERRORS.labels("llm", f"HTTP {response.status_code}").inc()
+            if response.status_code == 200 and span is not tracing.NOOP:
+                # Ollama renvoie ses propres durées (ns) : évaluation du prompt et génération
+                timings = response.json()
+                for key in ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration"):
+                    if key in timings:
+                        span.set(f"llm.{key}", timings[key])
 
         # --- DEBUG : On regarde ce que Ollama répond vraiment ---
         if response.status_code == 200:
             json_resp = response.json()
+            print(f"⏱️ Réponse d'Ollama en {time.perf_counter() - start:.2f} s "
+                  f"(prompt : {json_resp.get('prompt_eval_count', '?')} tokens évalués)")
             if "error" in json_resp:
                 print(f"❌ OLLAMA A REFUSÉ : {json_resp['error']}")
                 return f"Erreur du cerveau : {json_resp['error']}"
+            # Seules les vraies réponses sont gardées (pas les messages d'erreur)
+            if cache_key is not None:
+                STORE.put(cache_key, json_resp['response'])
             return json_resp['response']
         else:
             print(f"❌ ERREUR HTTP OLLAMA : {response.status_code} - {response.text}")
@@ -97,27 +250,389 @@ def ask_ollama(context, question):
         return "Je n'arrive pas à joindre mon cerveau IA (Ollama), mais voici les données brutes : " + str(context)
 
 
-# --- 4. ROUTES CLASSIQUES (POUR LE DASHBOARD) ---
+# --- 4. APPELS AUX MICROSERVICES (un seul point d'entrée par protocole) ---
+@contextmanager
+def observe_backend(backend, operation, **attributes):
+    """Span de traçage + durée et erreurs (métriques) d'un appel sortant."""
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"{backend}.{operation}", kind="client", **attributes) as span:
+            yield span
+    except Exception as e:
+        BACKEND_ERRORS.labels(backend, type(e).__name__).inc()
+        raise
+    finally:
+        BACKEND_LATENCY.labels(backend, operation).observe(time.perf_counter() - start)
+
+
+# Chaque backend passe par un disjoncteur avec délai max adaptatif (voir resilience.py).
+# Toutes les opérations ci-dessous sont des lectures : on peut les relancer (hedging).
+SOAP_BACKEND = resilience.Backend("soap", "Qualité de l'air (SOAP)")
+GRAPHQL_BACKEND = resilience.Backend("graphql", "Trafic (GraphQL)")
+REST_BACKEND = resilience.Backend("rest", "Transports (REST)")
+GRPC_BACKEND = resilience.Backend("grpc", "Énergie (gRPC)")
+
+
+# Un seul client SOAP (WSDL lu une fois) ; le délai adaptatif de chaque appel passe par _soap_timeout
+_soap_timeout = contextvars.ContextVar("soap_timeout", default=None)
+
+
+def make_soap_client():
+    from zeep import Client
+    from zeep.transports import Transport
+
+    class AdaptiveTransport(Transport):
+        def post(self, address, message, headers):
+            return self.session.post(address, data=message, headers=headers, timeout=_soap_timeout.get())
+
+    with observe_backend("soap", "wsdl_load"):
+        return Client(SOAP_URL, transport=AdaptiveTransport(timeout=resilience.TIMEOUT_MAX_S))
+
+
+SOAP_CLIENT = startup.Lazy("soap_client", make_soap_client)
+
+
+def soap_call(operation, **kwargs):
+    def attempt(timeout):
+        client = SOAP_CLIENT.get()
+        token = _soap_timeout.set(timeout)
+        try:
+            with observe_backend("soap", operation), client.settings(extra_http_headers=tracing.headers()):
+                return getattr(client.service, operation)(**kwargs)
+        finally:
+            _soap_timeout.reset(token)
+
+    return SOAP_BACKEND.call(attempt, idempotent=True)
+
+
+def http_call(backend, method, url, idempotent=True, **kwargs):
+    def attempt(timeout):
+        with observe_backend(backend.name, "request", url=url) as span:
+            res = requests.request(method, url, headers=tracing.headers(), timeout=timeout, **kwargs)
+            # elapsed = du début de l'envoi à la réception des en-têtes (connexion + traitement)
+            span.set("http.status_code", res.status_code)
+            span.set("http.elapsed_ms", res.elapsed.total_seconds() * 1000)
+            if res.status_code >= 400:
+                BACKEND_ERRORS.labels(backend.name, f"HTTP {res.status_code}").inc()
+            return res
+
+    # Un 5xx est rendu à l'appelant mais compte comme un échec pour le disjoncteur
+    return backend.call(attempt, idempotent=idempotent, is_failure=lambda res: res.status_code >= 500)
+
+
+def graphql_post(query, variables=None):
+    payload = {'query': query}
+    if variables is not None:
+        payload['variables'] = variables
+    return http_call(GRAPHQL_BACKEND, "POST", GRAPHQL_URL, json=payload)
+
+
+def rest_get():
+    return http_call(REST_BACKEND, "GET", REST_URL)
+
+
+def import_bulk_pb2():
+    import bulk_pb2
+    return bulk_pb2
+
+
+BULK_PB2 = startup.Lazy("bulk_pb2", import_bulk_pb2)
+
+
+def bulk_get(backend, url, message, **params):
+    """Export en masse d'un service, décodé (message protobuf de bulk.proto)."""
+    res = http_call(backend, "GET", url, params=params)
+    res.raise_for_status()
+    return getattr(BULK_PB2.get(), message).FromString(res.content)
+
+
+def import_energy_stubs():
+    try:
+        import energy_pb2
+        import energy_pb2_grpc
+    except ImportError:
+        print("❌ ERREUR : Copiez energy_pb2.py et energy_pb2_grpc.py dans ce dossier !")
+        raise
+    return energy_pb2, energy_pb2_grpc
+
+
+ENERGY_STUBS = startup.Lazy("energy_pb2", import_energy_stubs)
+
+
+def make_grpc_stub():
+    import grpc
+    _, energy_pb2_grpc = ENERGY_STUBS.get()
+    # Canal gardé ouvert : gRPC se reconnecte tout seul si le service redémarre
+    return energy_pb2_grpc.EnergyServiceStub(grpc.insecure_channel(GRPC_HOST))
+
+
+GRPC_STUB = startup.Lazy("grpc_channel", make_grpc_stub)
+
+
+def grpc_call(method, request_type, **fields):
+    """Ex: grpc_call("GetEnergyData", "EnergyRequest", building_id="Batiment_A")."""
+    def attempt(timeout):
+        stub = GRPC_STUB.get()
+        request = getattr(ENERGY_STUBS.get()[0], request_type)(**fields)
+        with observe_backend("grpc", method):
+            return getattr(stub, method)(request, metadata=tracing.grpc_metadata(), timeout=timeout)
+
+    return GRPC_BACKEND.call(attempt, idempotent=True)
+
+
+# --- 5. PHOTO DE LA VILLE EN MÉMOIRE (voir snapshot.py) ---
+# Un thread interroge les 4 services toutes les SNAPSHOT_INTERVAL_S secondes ; les routes
+# lisent ensuite la mémoire au lieu de refaire un appel réseau à chaque requête.
+# Prévision sur TRAFFIC_FORECAST_MIN minutes (historique du service trafic), par pas de 15 min
+FORECAST_FIELDS = "forecast(horizonMinutes: $horizon, stepMinutes: 15) { minutesAhead expectedSpeed expectedCongestion }"
+TRAFFIC_LIST_QUERY = """query($horizon: Int!) {
+  allTraffic { roadId congestionLevel averageSpeed latitude longitude %s }
+}""" % FORECAST_FIELDS
+
+
+# Un capteur tel que renvoyé par le service (liste ou événement du bus) -> (clé, lat, lon, payload)
+def air_record(s, previous=None):
+    # Clé en minuscules : /api/air/{city} ne tient pas compte de la casse (comme le service SOAP)
+    return (s['city'].lower(), s['latitude'], s['longitude'],
+            {"station": s['station'], "aqi": s['aqi'], "status": s['status']})
+
+
+def traffic_record(r, previous=None):
+    # Les événements portent la prévision recalculée (coupée à notre horizon) ; sans elle, l'ancienne
+    # prévision n'est gardée que si la vitesse n'a pas changé
+    if 'forecast' in r:
+        forecast = [p for p in r['forecast'] or [] if p['minutesAhead'] <= TRAFFIC_FORECAST_MIN]
+    elif previous and previous.get('averageSpeed') == r['averageSpeed']:
+        forecast = previous.get('forecast')
+    else:
+        forecast = None
+    return (r['roadId'], r['latitude'], r['longitude'],
+            {"congestionLevel": r['congestionLevel'], "averageSpeed": r['averageSpeed'], "forecast": forecast})
+
+
+def mobility_record(t, previous=None):
+    return (t['id'], t.get('latitude'), t.get('longitude'), t)
+
+
+def energy_record(b, previous=None):
+    return (b['building_id'], b['latitude'], b['longitude'],
+            {"consumption_kwh": b['consumption_kwh'], "status": b['status']})
+
+
+# Messages des exports protobuf -> mêmes enregistrements que les formats texte
+def air_records_pb(message):
+    return [(s.city.lower(), s.latitude, s.longitude, {"station": s.station, "aqi": s.aqi, "status": s.status})
+            for s in message.stations]
+
+
+def traffic_records_pb(message):
+    return [(r.road_id, r.latitude, r.longitude, {
+        "congestionLevel": r.congestion_level, "averageSpeed": r.average_speed,
+        "forecast": [{"minutesAhead": p.minutes_ahead,
+                      "expectedSpeed": p.expected_speed if p.HasField("expected_speed") else None,
+                      "expectedCongestion": p.expected_congestion} for p in r.forecast],
+    }) for r in message.roads]
+
+
+def mobility_records_pb(message):
+    records = []
+    for t in message.transports:
+        lat = t.latitude if t.HasField("latitude") else None
+        lon = t.longitude if t.HasField("longitude") else None
+        records.append((t.id, lat, lon, {"id": t.id, "type": t.type, "ligne": t.ligne, "destination": t.destination,
+                                         "status": t.status, "latitude": lat, "longitude": lon}))
+    return records
+
+
+def fetch_air():
+    if BULK_EXPORT:
+        return air_records_pb(bulk_get(SOAP_BACKEND, SOAP_BULK_URL, "AirStations"))
+    return [air_record(s) for s in soap_call("list_stations")]
+
+
+def fetch_traffic():
+    if BULK_EXPORT:
+        return traffic_records_pb(bulk_get(GRAPHQL_BACKEND, GRAPHQL_BULK_URL, "TrafficRoads",
+                                           horizon_minutes=TRAFFIC_FORECAST_MIN))
+    res = graphql_post(TRAFFIC_LIST_QUERY, {"horizon": TRAFFIC_FORECAST_MIN})
+    res.raise_for_status()
+    return [traffic_record(r) for r in res.json().get('data', {}).get('allTraffic') or []]
+
+
+def fetch_mobility():
+    if BULK_EXPORT:
+        return mobility_records_pb(bulk_get(REST_BACKEND, REST_BULK_URL, "Transports"))
+    res = rest_get()
+    res.raise_for_status()
+    return [mobility_record(t) for t in res.json()]
+
+
+def fetch_energy():
+    return [(b.building_id, b.latitude, b.longitude, {"consumption_kwh": b.consumption_kwh, "status": b.status})
+            for b in grpc_call("ListEnergyData", "EnergyListRequest").buildings]
+
+
+def traced_fetch(kind, fetch):
+    def run():
+        with tracing.span(f"snapshot.fetch {kind}"):
+            return fetch()
+    return run
+
+
+SNAPSHOT = SnapshotRefresher({kind: traced_fetch(kind, fetch) for kind, fetch in (
+    ("air", fetch_air), ("traffic", fetch_traffic), ("mobility", fetch_mobility), ("energy", fetch_energy))},
+    interval=EVENT_RESYNC_S if BUS.remote else SNAPSHOT_INTERVAL_S, store=STORE,
+    shared_max_age=2 * SNAPSHOT_INTERVAL_S if SNAPSHOT_INTERVAL_S > 0 and not BUS.remote else GEO_INDEX_TTL)
+
+metrics.gauge_function("smartcity_snapshot_age_seconds", "Âge de chaque source de la photo de la ville.",
+                       lambda: {(kind, ): round(src.age(), 3)
+                                for kind, src in (SNAPSHOT.current.sources.items() if SNAPSHOT.current else ())},
+                       ["source"])
+
+
+# Mises à jour poussées par les services : sujet "sensor.<source>" -> enregistrement de la photo
+EVENT_RECORDS = {"air": air_record, "traffic": traffic_record, "mobility": mobility_record, "energy": energy_record}
+# Clé d'un capteur supprimé (même règle que l'enregistrement)
+EVENT_KEYS = {"air": lambda key: key.lower()}
+# Numéros des événements par service : un trou = des changements perdus
+EVENT_SEQS = eventbus.SeqTracker()
+
+
+def on_sensor_events(events):
+    """Un lot d'événements du bus -> une nouvelle version de chaque source concernée.
+
+    S'il manque des événements d'un service, ses signes de vie ne prouvent plus que la
+    photo est à jour : on la réinterroge entièrement.
+    """
+    by_source, gaps = {}, {}
+    for event in events:
+        kind = event.topic.split(".", 1)[-1]
+        by_source.setdefault(kind, []).append(event)
+        gap = EVENT_SEQS.check(event)
+        if gap:
+            gaps[kind] = gap
+    now = time.time()
+    for kind, batch in by_source.items():
+        to_record = EVENT_RECORDS.get(kind)
+        if to_record is None:
+            continue
+        current = SNAPSHOT.current
+        items = current.sources[kind].items if current is not None and kind in current.sources else {}
+        changes = []
+        for event in batch:
+            if event.key is None:
+                EVENTS_RECEIVED.labels(kind, "heartbeat").inc()
+                continue
+            if event.payload is None:
+                changes.append((EVENT_KEYS.get(kind, lambda key: key)(event.key), None))
+                EVENTS_RECEIVED.labels(kind, "delete").inc()
+            else:
+                record = to_record(event.payload, items.get(event.key))
+                changes.append((record[0], record))
+                EVENTS_RECEIVED.labels(kind, "update").inc()
+            EVENT_LAG.labels(kind).observe(now - event.published_at)
+        if changes or kind not in gaps:
+            SNAPSHOT.apply(kind, changes, max(event.published_at for event in batch))
+
+    if gaps:
+        for kind, gap in gaps.items():
+            EVENT_GAPS.labels(kind).inc()
+            print(f"⚠️ Bus d'événements : {gap}, photo de la ville réinterrogée")
+        SNAPSHOT.refresh()
+
+
+def get_snapshot():
+    """Photo courante. Sans thread de fond (SNAPSHOT_INTERVAL_S=0), refaite à la demande."""
+    return SNAPSHOT.get(lazy_ttl=GEO_INDEX_TTL, retry_s=GEO_INDEX_RETRY_S)
+
+
+def fresh_source(kind):
+    """La source si elle a moins de SNAPSHOT_MAX_AGE_S secondes, sinon None (appel direct au service)."""
+    src = get_snapshot().source(kind, max_age=SNAPSHOT_MAX_AGE_S)
+    CACHE_REQUESTS.labels("snapshot", "hit" if src is not None else "stale").inc()
+    return src
+
+
+def snapshot_item(kind, key):
+    """(payload, âge) depuis la photo, ou (None, None) si absent ou trop vieux."""
+    src = fresh_source(kind)
+    if src is None or key not in src.items:
+        return None, None
+    return src.items[key], src.age()
+
+
+def age_field(*ages):
+    """Âge (s) de la donnée la plus ancienne utilisée ; None si tout vient d'appels directs."""
+    ages = [a for a in ages if a is not None]
+    return round(max(ages), 3) if ages else None
+
+
+# Lectures : la photo d'abord, le service en direct sinon. Renvoient (données, âge).
+TRAFFIC_QUERY = """query($roadId: String!, $horizon: Int!) {
+  getTraffic(roadId: $roadId) { congestionLevel averageSpeed %s }
+}""" % FORECAST_FIELDS
+
+
+def read_air(city):
+    item, age = snapshot_item("air", city.lower())
+    if item is not None:
+        return item, age
+    res = soap_call("get_air_quality", city=city)
+    return {"aqi": res.aqi, "status": res.status, "station": res.station}, None
+
+
+def read_traffic(road_id):
+    """Lève HTTPException si GraphQL répond une erreur HTTP."""
+    item, age = snapshot_item("traffic", road_id)
+    if item is not None:
+        return item, age
+    res = graphql_post(TRAFFIC_QUERY, {"roadId": road_id, "horizon": TRAFFIC_FORECAST_MIN})
+    if res.status_code != 200:
+        raise HTTPException(status_code=res.status_code, detail="Erreur GraphQL")
+    return res.json().get('data', {}).get('getTraffic'), None
+
+
+def read_transports():
+    src = fresh_source("mobility")
+    if src is not None:
+        return list(src.items.values()), src.age()
+    return [t for _, _, _, t in fetch_mobility()], None
+
+
+def read_energy(building_id):
+    item, age = snapshot_item("energy", building_id)
+    if item is not None:
+        return item, age
+    res = grpc_call("GetEnergyData", "EnergyRequest", building_id=building_id)
+    return {"consumption_kwh": res.consumption_kwh, "status": res.status}, None
+
+
+def describe_hits(hits):
+    return [{"id": key, "distance_km": round(dist, 3), **payload} for dist, key, payload in hits]
+
+
+# --- 6. ROUTES CLASSIQUES (POUR LE DASHBOARD) ---
 
 @app.get("/api/air/{city}", tags=["Environnement"])
 def get_air_quality(city: str):
     try:
-        client = Client(SOAP_URL)
-        res = client.service.get_air_quality(city=city)
-        return {"data": {"aqi": res.aqi, "status": res.status, "station": res.station}}
+        data, age = read_air(city)
+        return {"data": data, "snapshot_age_s": age_field(age)}
+    except resilience.CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur SOAP: {str(e)}")
 
 
 @app.get("/api/traffic/{road_id}", tags=["Transport"])
 def get_traffic(road_id: str):
-    query = """query($roadId: String!) { getTraffic(roadId: $roadId) { congestionLevel averageSpeed } }"""
     try:
-        res = requests.post(GRAPHQL_URL, json={'query': query, 'variables': {"roadId": road_id}})
-        if res.status_code == 200:
-            data = res.json().get('data', {}).get('getTraffic')
-            return {"data": data}
-        raise HTTPException(status_code=res.status_code, detail="Erreur GraphQL")
+        data, age = read_traffic(road_id)
+        return {"data": data, "snapshot_age_s": age_field(age)}
+    except HTTPException:
+        raise
+    except resilience.CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur connexion: {str(e)}")
 
@@ -125,8 +640,10 @@ def get_traffic(road_id: str):
 @app.get("/api/mobility", tags=["Transport"])
 def get_public_transports():
     try:
-        res = requests.get(REST_URL)
-        return {"data": res.json()}
+        data, age = read_transports()
+        return {"data": data, "snapshot_age_s": age_field(age)}
+    except resilience.CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur REST: {str(e)}")
 
@@ -134,93 +651,265 @@ def get_public_transports():
 @app.get("/api/energy/{building_id}", tags=["Énergie"])
 def get_energy_consumption(building_id: str):
     try:
-        with grpc.insecure_channel(GRPC_HOST) as channel:
-            stub = energy_pb2_grpc.EnergyServiceStub(channel)
-            res = stub.GetEnergyData(energy_pb2.EnergyRequest(building_id=building_id))
-            return {"data": {"consumption_kwh": res.consumption_kwh, "status": res.status}}
+        data, age = read_energy(building_id)
+        return {"data": data, "snapshot_age_s": age_field(age)}
+    except resilience.CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur gRPC: {str(e)}")
 
 
-# --- 5. ROUTE INTELLIGENTE : CHATBOT GRAND TUNIS 🧠 ---
+@app.get("/api/nearby", tags=["Géographie"])
+def get_nearby_sensors(lat: float = Query(..., ge=-90, le=90), lon: float = Query(..., ge=-180, le=180),
+                       radius_km: float = Query(NEARBY_RADIUS_KM, gt=0, le=NEARBY_MAX_RADIUS_KM),
+                       k: int = Query(1, gt=0, le=NEARBY_MAX_K)):
+    """Capteurs autour d'un point : k plus proches (air, trafic, énergie) et arrêts dans le rayon."""
+    snapshot = get_snapshot()
+    return {"data": {
+        "air": describe_hits(snapshot.index("air").nearest(lat, lon, k=k)),
+        "traffic": describe_hits(snapshot.index("traffic").nearest(lat, lon, k=k)),
+        "energy": describe_hits(snapshot.index("energy").nearest(lat, lon, k=k)),
+        "mobility": describe_hits(snapshot.index("mobility").within(lat, lon, radius_km)),
+    }, "snapshot_age_s": age_field(*(src.age() for src in snapshot.sources.values()))}
+
+
+# --- 7. ROUTE INTELLIGENTE : CHATBOT GRAND TUNIS 🧠 ---
+# Faits d'un quartier, rendus une fois par version de la photo de la ville
+PLACE_FACTS = prompt.FragmentCache(maxsize=128)
+CHAT_SOURCES = ("mobility", "traffic", "air")
+
+
+LIVE_READS = {"transports": read_transports, "traffic": read_traffic, "air": read_air}
+
+
+def batch_reads():
+    """Lectures mémorisées le temps d'un lot de questions : chaque capteur n'est lu qu'une fois."""
+    memo = {}
+
+    def memoized(name, read):
+        def run(*args):
+            if (name, args) not in memo:
+                memo[name, args] = read(*args)
+            return memo[name, args]
+        return run
+
+    return {name: memoized(name, read) for name, read in LIVE_READS.items()}
+
+
+def place_facts(place, snapshot, reads=LIVE_READS):
+    """Faits (prompt.Fact) autour d'un quartier et âges des données utilisées."""
+    fresh = [snapshot.source(kind, max_age=SNAPSHOT_MAX_AGE_S) for kind in CHAT_SOURCES]
+    # Toutes les sources viennent de la photo : le résultat ne dépend que de leur version
+    version = (place, ) + tuple(src.version for src in fresh) if all(fresh) else None
+    if version is not None:
+        cached = PLACE_FACTS.get(version)
+        CACHE_REQUESTS.labels("chat_facts", "hit" if cached is not None else "miss").inc()
+        if cached is not None:
+            return cached, [src.age() for src in fresh]
+
+    lat, lon = PLACES[place]
+    facts, ages = [], []
+
+    # A. Transports (Bus/Metro/TGM) : arrêts dans le rayon du quartier
+    try:
+        all_transports, age = reads["transports"]()
+        ages.append(age)
+        nearby_ids = {key for _, key, _ in snapshot.index("mobility").within(lat, lon, NEARBY_RADIUS_KM)}
+        for t in all_transports:
+            if t['id'] in nearby_ids or place in t['destination'].lower():
+                dist = NEARBY_RADIUS_KM if t.get('latitude') is None else \
+                    haversine_km(lat, lon, t['latitude'], t['longitude'])
+                facts.append(prompt.transport_fact(place, t, dist))
+    except Exception:
+        CHAT_CONTEXT_ERRORS.labels("transport").inc()
+
+    # B. Trafic de la route la plus proche
+    nearest_road = snapshot.index("traffic").nearest(lat, lon)
+    if nearest_road:
+        dist, road, _ = nearest_road[0]
+        try:
+            data, age = reads["traffic"](road)
+            ages.append(age)
+            if data:
+                facts.append(prompt.traffic_fact(place, road, data, dist))
+                # Route encore fluide mais bouchon prévu : on prévient avant qu'il arrive
+                expected_jam = prompt.forecast_fact(place, road, data, dist)
+                if expected_jam:
+                    facts.append(expected_jam)
+        except Exception:
+            CHAT_CONTEXT_ERRORS.labels("traffic").inc()
+
+    # C. Air : station la plus proche du quartier
+    nearest_station = snapshot.index("air").nearest(lat, lon)
+    if nearest_station:
+        dist, city, _ = nearest_station[0]
+        try:
+            data, age = reads["air"](city)
+            ages.append(age)
+            facts.append(prompt.air_fact(place, data, dist))
+        except Exception:
+            CHAT_CONTEXT_ERRORS.labels("air").inc()
+
+    if version is not None and len(ages) == len(CHAT_SOURCES):
+        PLACE_FACTS.put(version, facts)
+    return facts, ages
+
+
+def chat_context(facts):
+    """Contexte envoyé à l'IA : faits les plus pertinents + état des capteurs."""
+    # SERVICES COUPÉS PAR LE DISJONCTEUR : on le signale à l'IA au lieu de se taire
+    unavailable = resilience.unavailable()
+    notes = []
+
+    # SI RIEN TROUVÉ
+    if not facts:
+        if unavailable:
+            notes.append(f"Capteurs momentanément indisponibles : {', '.join(unavailable)}. Dis-le à l'utilisateur.")
+        else:
+            notes.append("Aucune donnée précise trouvée dans les capteurs. Dis à l'utilisateur que tu gères les zones : Marsa, Lac, Bardo, Centre-Ville, Ennasr, Mourouj...")
+    elif unavailable:
+        notes.append(f"Capteurs indisponibles : {', '.join(unavailable)}")
+
+    # Les faits les plus pertinents, dans la limite du budget de tokens
+    context, dropped = prompt.build_context(facts, PROMPT_TOKEN_BUDGET, notes)
+    print(f"📊 Données envoyées à l'IA ({len(facts) - dropped}/{len(facts)} faits, "
+          f"~{prompt.estimate_tokens(context)}/{PROMPT_TOKEN_BUDGET} tokens) :\n{context}")
+    return context
+
+
 @app.post("/api/chat", tags=["IA"])
 def chat_with_city(request: ChatRequest):
     user_text = request.question.lower()
-    context_data = {}
 
     print(f"📩 Question sur le Grand Tunis : {user_text}")
 
-    # CARTE INTELLIGENTE (Quartier -> Route Principale)
-    neighborhood_map = {
-        # Banlieue Nord
-        "marsa": "GP9", "carthage": "GP9", "goulette": "GP9", "aouina": "GP9", "sidi bou": "GP9",
-        # Lac
-        "lac": "Lac", "kram": "Lac",
-        # Ariana / Menzah / Ennasr
-        "ariana": "X20", "ennasr": "X20", "menzah": "X20", "ghazela": "X20",
-        # Bardo / Manouba
-        "bardo": "Route X", "manouba": "Route X", "campus": "Route X", "manar": "Route X",
-        # Banlieue Sud
-        "mourouj": "GP1", "rades": "GP1", "ezzahra": "GP1", "hammam lif": "GP1", "ben arous": "GP1",
-        # Centre
-        "centre": "Z4", "tunis": "Z4", "passage": "Z4"
-    }
-
-    # ANALYSE AUTOMATIQUE
-    detected_place = None
-
-    # On parcourt la carte
-    for place, road in neighborhood_map.items():
-        if place in user_text:
-            detected_place = place
-
-            # A. Transports (Bus/Metro/TGM) via REST
-            try:
-                res = requests.get(REST_URL)
-                all_transports = res.json()
-                relevant = [t for t in all_transports if place in t['destination'].lower()]
-
-                if relevant:
-                    context_data[f"Transport vers {place.capitalize()}"] = str(relevant)
-                else:
-                    context_data[f"Transport vers {place.capitalize()}"] = "Pas de ligne directe trouvée."
-            except:
-                pass
-
-            # B. Trafic Route Principale via GraphQL
-            try:
-                query = """query($roadId: String!) { getTraffic(roadId: $roadId) { congestionLevel averageSpeed } }"""
-                res = requests.post(GRAPHQL_URL, json={'query': query, 'variables': {"roadId": road}})
-                data = res.json().get('data', {}).get('getTraffic')
-
-                if data:
-                    context_data[
-                        f"Route Principale ({road})"] = f"Vitesse={data['averageSpeed']}km/h, État={data['congestionLevel']}"
-            except:
-                pass
-
-            # C. Météo (Air) via SOAP - On prend Tunis par défaut
-            try:
-                client = Client(SOAP_URL)
-                res = client.service.get_air_quality(city="Tunis")
-                context_data[f"Air sur le Grand Tunis"] = f"AQI={res.aqi}, Status={res.status}"
-            except:
-                pass
-
-    # SI RIEN TROUVÉ
-    if not context_data:
-        context_data = "Aucune donnée précise trouvée dans les capteurs. Dis à l'utilisateur que tu gères les zones : Marsa, Lac, Bardo, Centre-Ville, Ennasr, Mourouj..."
+    # ANALYSE AUTOMATIQUE : quartiers cités -> coordonnées -> capteurs les plus proches
+    snapshot = get_snapshot()
+    facts, ages = [], []
+    for place in find_places(user_text):
+        place_result, place_ages = place_facts(place, snapshot)
+        facts.extend(place_result)
+        ages.extend(place_ages)
 
     # ENVOI A OLLAMA
-    print(f"📊 Données envoyées à l'IA : {context_data}")
-    ai_response = ask_ollama(context_data, request.question)
+    ai_response = ask_ollama(chat_context(facts), request.question)
+
+    return {"response": ai_response, "snapshot_age_s": age_field(*ages)}
+
+
+# --- 8. LOT DE QUESTIONS (CONSOLES OPÉRATEUR) ---
+class ChatBatchRequest(BaseModel):
+    questions: List[str]
+
+
+# Générations des lots : un seul pool pour tous les lots, autant de threads que l'IA a de places
+CHAT_BATCH_POOL = ThreadPoolExecutor(max_workers=LLM_GATE.max_in_flight, thread_name_prefix="chat-batch")
+
+
+@app.post("/api/chat/batch", tags=["IA"])
+def chat_batch(request: ChatBatchRequest):
+    """Plusieurs questions d'un coup : capteurs lus une seule fois pour tout le lot,
+    générations en parallèle sur les places libres de l'IA, réponses dans l'ordre."""
+    if len(request.questions) > CHAT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"{CHAT_BATCH_MAX} questions max par lot")
+    start = time.perf_counter()
+    print(f"📦 Lot de {len(request.questions)} questions")
+
+    # A. Lectures des capteurs : une fois par quartier cité, quel que soit le nombre de questions
+    snapshot = get_snapshot()
+    reads = batch_reads()
+    questions_places = [find_places(q.lower()) for q in request.questions]
+    by_place, ages = {}, []
+    for place in dict.fromkeys(p for places in questions_places for p in places):
+        by_place[place], place_ages = place_facts(place, snapshot, reads)
+        ages.extend(place_ages)
+    fetch_s = time.perf_counter() - start
+
+    # B. Générations : autant en parallèle que l'IA a de places, priorité sous le chat en direct
+    def answer(question, places):
+        t0 = time.perf_counter()
+        context = chat_context([fact for place in places for fact in by_place[place]])
+        t1 = time.perf_counter()
+        response = ask_ollama(context, question, priority=1)
+        return {"question": question, "response": response, "places": places,
+                "context_ms": round((t1 - t0) * 1000, 1), "llm_ms": round((time.perf_counter() - t1) * 1000, 1)}
+
+    # copy_context : chaque génération garde le span de traçage de la requête
+    futures = [CHAT_BATCH_POOL.submit(contextvars.copy_context().run, answer, q, places)
+               for q, places in zip(request.questions, questions_places)]
+    answers = [f.result() for f in futures]
+
+    return {"answers": answers, "snapshot_age_s": age_field(*ages),
+            "fetch_ms": round(fetch_s * 1000, 1), "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+# --- 9. DÉMARRAGE : CHAUFFE EN TÂCHE DE FOND + DISPONIBILITÉ ---
+metrics.gauge_function("smartcity_startup_phase_seconds", "Durée de chaque étape du démarrage.",
+                       lambda: {(name, ): round(seconds, 4) for name, seconds in startup.PHASES.items()},
+                       ["phase"])
+metrics.gauge_function("smartcity_ready", "1 quand la chauffe est terminée.", lambda: int(startup.READY.is_set()))
+
+
+def warmup():
+    """Clients des backends, abonnement au bus puis première photo de la ville, hors du chemin des requêtes."""
+    for client in (SOAP_CLIENT, GRPC_STUB) + ((BULK_PB2, ) if BULK_EXPORT else ()):
+        try:
+            client.get()
+        except Exception as e:
+            # Pas bloquant : le client sera recréé au premier appel
+            print(f"⚠️ Chauffe : {client.name} indisponible ({e})")
+    if BUS.remote:
+        # Abonné avant la première photo : aucun changement publié entre les deux n'est perdu
+        BUS.on_reconnect(SNAPSHOT.refresh)
+        BUS.subscribe("sensor.", on_sensor_events)
+    with startup.phase("snapshot"):
+        SNAPSHOT.refresh()
+    if SNAPSHOT.interval > 0:
+        SNAPSHOT.start()
+    startup.PHASES["ready"] = startup.since_start()
+    startup.READY.set()
+    print(f"✅ Gateway prête en {startup.since_start():.2f} s "
+          f"({', '.join(f'{k}={v * 1000:.0f}ms' for k, v in startup.PHASES.items())})")
+
+
+@app.on_event("startup")
+def start_warmup():
+    log_config()
+    threading.Thread(target=warmup, daemon=True, name="warmup").start()
+
+
+@app.get("/ready", tags=["Supervision"])
+def readiness():
+    """200 quand la chauffe est terminée (clients créés, photo de la ville chargée), 503 avant."""
+    ready = startup.READY.is_set()
+    body = {
+        "ready": ready,
+        "uptime_s": round(startup.since_start(), 3),
+        "startup_ms": {name: round(seconds * 1000, 1) for name, seconds in startup.PHASES.items()},
+        "snapshot_complete": SNAPSHOT.current is not None and not SNAPSHOT.failed,
+        "events_connected": BUS.connected if BUS.remote else None,
+    }
+    return JSONResponse(body, status_code=200 if ready else 503)
 
-    return {"response": ai_response}
 
+startup.PHASES["import"] = startup.since_start()
 
 # Lancement
 if __name__ == "__main__":
     import uvicorn
 
-    print("🚀 Démarrage de la Gateway sur http://localhost:8000")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    print(f"🚀 Démarrage de la Gateway sur http://localhost:8000 ({GATEWAY_WORKERS} worker(s))")
+    if GATEWAY_WORKERS > 1:
+        # Les workers relisent ce module : le dossier partagé leur est transmis par l'environnement
+        created = None
+        if not os.getenv('SHARED_CACHE_DIR'):
+            created = tempfile.mkdtemp(prefix="smartcity-gateway-",
+                                       dir="/dev/shm" if os.path.isdir("/dev/shm") else None)
+            os.environ['SHARED_CACHE_DIR'] = created
+        try:
+            uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=GATEWAY_WORKERS)
+        finally:
+            if created:
+                shutil.rmtree(created, ignore_errors=True)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,342 @@
+"""Métriques Prometheus (compteurs, jauges, histogrammes) sans dépendance externe.
+
+Copie identique dans chaque service (comme tracing.py). Chaque thread
+incrémente sa propre cellule : pas de verrou sur le chemin chaud, la lecture
+(/metrics) additionne les cellules de tous les threads. Quand un thread se
+termine, sa cellule est versée dans un total de base puis oubliée.
+
+    REQUESTS = metrics.Counter("smartcity_x_total", "Aide", ["route"])
+    REQUESTS.labels("/api/air").inc()
+"""
+import bisect
+import threading
+import time
+import weakref
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Bornes par défaut des histogrammes de latence (secondes)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 120.0)
+
+REGISTRY = []
+
+
+# --- 1. CELLULES PAR THREAD ---
+class _Cells:
+    """Une cellule (liste de nombres) par thread vivant ; seul le thread propriétaire y écrit.
+
+    Les cellules des threads terminés (un thread par requête, exécuteurs jetables)
+    sont additionnées dans base : la mémoire et le coût d'un scrape restent bornés.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+        self.base = [0] * size
+        self.cells = {}  # id(cellule) -> cellule
+        self.retired = deque()  # Cellules des threads terminés, pas encore versées dans base
+        self.lock = threading.Lock()  # Seulement à la création d'une cellule et au scrape
+
+    def mine(self):
+        cell = getattr(self.local, "cell", None)
+        if cell is None:
+            cell = [0] * self.size
+            self.local.cell = cell
+            with self.lock:
+                self._fold_retired()
+                self.cells[id(cell)] = cell
+            # Appelé quand l'objet Thread disparaît (thread terminé). Sans verrou : le
+            # ramasse-miettes peut le déclencher n'importe où, même sous self.lock
+            weakref.finalize(threading.current_thread(), self.retired.append, cell)
+        return cell
+
+    def _fold_retired(self):
+        while self.retired:
+            cell = self.retired.popleft()
+            for i, n in enumerate(cell):
+                self.base[i] += n
+            del self.cells[id(cell)]
+
+    def totals(self):
+        with self.lock:
+            self._fold_retired()
+            cells = [self.base, *self.cells.values()]
+            return [sum(c[i] for c in cells) for i in range(self.size)]
+
+
+# --- 2. TYPES DE MÉTRIQUES ---
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._new_child())
+        return child
+
+    def _label_str(self, values, extra=None):
+        pairs = list(zip(self.labelnames, values)) + (extra or [])
+        if not pairs:
+            return ""
+        escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+        return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            children = list(self.children.items())
+        for values, child in children:
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    # Raccourcis pour les métriques sans label
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def dec(self, amount=1):
+        self.labels().dec(amount)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+
+class _CounterChild:
+    def __init__(self):
+        self.cells = _Cells(1)
+
+    def inc(self, amount=1):
+        self.cells.mine()[0] += amount
+
+    def dec(self, amount=1):
+        self.cells.mine()[0] -= amount
+
+    @property
+    def value(self):
+        return self.cells.totals()[0]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_str(values)} {child.value}"]
+
+
+class Gauge(Counter):
+    """Jauge incrémentale (ex: requêtes en cours) : inc() à l'entrée, dec() à la sortie."""
+    kind = "gauge"
+
+
+class _FunctionGauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, documentation, fn, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        if not self.labelnames:
+            return lines + [f"{self.name} {self.fn()}"]
+        return lines + [f"{self.name}{self._label_str(values)} {value}" for values, value in self.fn().items()]
+
+
+def gauge_function(name, documentation, fn, labelnames=()):
+    """Jauge calculée au moment du scrape (ex: âge d'un cache).
+
+    Avec des labels, fn renvoie un dict {(valeurs des labels): valeur}.
+    """
+    return _FunctionGauge(name, documentation, fn, labelnames)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Une case par seau + la somme + le nombre total
+        self.cells = _Cells(len(buckets) + 2)
+
+    def observe(self, value):
+        cell = self.cells.mine()
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            cell[i] += 1
+        cell[-2] += value
+        cell[-1] += 1
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, child):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def time(self):
+        return self.labels().time()
+
+    def _render_child(self, values, child):
+        totals = child.cells.totals()
+        lines, cumulative = [], 0
+        for bound, n in zip(self.buckets, totals):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{self._label_str(values, [('le', repr(float(bound)))])} {cumulative}")
+        lines.append(f"{self.name}_bucket{self._label_str(values, [('le', '+Inf')])} {totals[-1]}")
+        lines.append(f"{self.name}_sum{self._label_str(values)} {totals[-2]}")
+        lines.append(f"{self.name}_count{self._label_str(values)} {totals[-1]}")
+        return lines
+
+
+def render():
+    """Toutes les métriques au format texte Prometheus."""
+    lines = []
+    for metric in list(REGISTRY):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- 3. MÉTRIQUES HTTP COMMUNES + MIDDLEWARES ---
+HTTP_REQUESTS = Counter("smartcity_http_requests_total", "Requêtes HTTP reçues.",
+                        ["route", "method", "status"])
+HTTP_LATENCY = Histogram("smartcity_http_request_duration_seconds", "Durée des requêtes HTTP reçues.",
+                         ["route", "method"])
+HTTP_IN_FLIGHT = Gauge("smartcity_http_requests_in_flight", "Requêtes HTTP en cours de traitement.")
+
+
+def _observe_http(route, method, status, elapsed):
+    HTTP_REQUESTS.labels(route, method, str(status)).inc()
+    HTTP_LATENCY.labels(route, method).observe(elapsed)
+
+
+class AsgiMiddleware:
+    """FastAPI : sert /metrics et mesure chaque requête (label = modèle de route, ex: /api/air/{city})."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        if scope["path"] == "/metrics":
+            body = render().encode()
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", CONTENT_TYPE.encode()),
+                                    (b"content-length", str(len(body)).encode())]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Routes inconnues regroupées pour ne pas exploser le nombre de séries
+            _observe_http(route.path if route is not None else "<unmatched>", scope["method"], status,
+                          time.perf_counter() - start)
+
+
+class WsgiMiddleware:
+    """Flask / Spyne : sert /metrics et mesure chaque requête.
+
+    Label = chemin s'il fait partie de routes, sinon "<unmatched>" (comme AsgiMiddleware) :
+    des chemins au hasard ne créent pas de nouvelles séries.
+    """
+
+    def __init__(self, app, routes=("/",)):
+        self.app = app
+        self.routes = frozenset(routes)
+
+    def __call__(self, environ, start_response):
+        path = environ.get("PATH_INFO") or "/"
+        if path == "/metrics":
+            body = render().encode()
+            start_response("200 OK", [("Content-Type", CONTENT_TYPE), ("Content-Length", str(len(body)))])
+            return [body]
+
+        status = ["500"]
+        start = time.perf_counter()
+
+        def start_response_wrapper(status_line, headers, exc_info=None):
+            status[0] = status_line.split(" ", 1)[0]
+            return start_response(status_line, headers, exc_info)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            result = self.app(environ, start_response_wrapper)
+            try:
+                return list(result)
+            finally:
+                # Contrat WSGI : toujours fermer l'itérable renvoyé par l'application
+                if hasattr(result, "close"):
+                    result.close()
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            _observe_http(path if path in self.routes else "<unmatched>", environ.get("REQUEST_METHOD", "GET"),
+                          status[0], time.perf_counter() - start)
+
+
+def start_http_server(port, host="0.0.0.0"):
+    """Expose /metrics sur un port dédié (services sans serveur HTTP, ex: gRPC)."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
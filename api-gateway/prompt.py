@@ -0,0 +1,129 @@
+"""Contexte compact pour le prompt de l'IA.
+
+Les faits (un arrêt, une route, une station) sont notés selon leur pertinence
+pour les quartiers cités, puis rendus en tableaux "a|b|c" (une ligne par fait)
+jusqu'à épuisement d'un budget de tokens. Les moins pertinents sont omis.
+
+    facts = [Fact(2.3, "traffic", "GP9", "Marsa|GP9|15|Saturé")]
+    context = build_context(facts, budget=300)
+"""
+import math
+import threading
+from collections import OrderedDict, namedtuple
+
+# Tableaux dans leur ordre d'affichage : nom -> en-tête (colonnes)
+TABLES = OrderedDict([
+    ("traffic", "Trafic (quartier|route|km/h|état)"),
+    ("forecast", "Bouchons prévus (quartier|route|dans min|km/h prévus|état prévu)"),
+    ("transport", "Transports (quartier|type|ligne|destination|état|km)"),
+    ("air", "Air (quartier|station|AQI|état|km)"),
+])
+
+# États "normaux" : les autres sont des alertes et passent en priorité
+NORMAL_TRANSPORT = {"A l'heure", "Opérationnel", "Fluide"}
+NORMAL_TRAFFIC = {"Fluide", "Modéré"}
+JAM_LEVELS = {"Saturé", "Bloqué", "Bouché"}
+AQI_ALERT = 100
+
+# score : plus c'est grand, plus c'est pertinent ; key : identifiant du capteur (dédoublonnage)
+Fact = namedtuple("Fact", "score table key row")
+
+
+def estimate_tokens(text):
+    """Approximation sans tokenizer : ~4 caractères par token."""
+    return math.ceil(len(text) / 4)
+
+
+def proximity(distance_km):
+    """1 sur place, 0.5 à 1 km, ~0 au loin."""
+    return 1.0 / (1.0 + distance_km)
+
+
+def transport_fact(place, t, distance_km):
+    alert = t['status'] not in NORMAL_TRANSPORT
+    return Fact(proximity(distance_km) + alert, "transport", t['id'],
+                f"{place.capitalize()}|{t['type']}|{t['ligne']}|{t['destination']}|{t['status']}|{distance_km:.1f}")
+
+
+def traffic_fact(place, road, data, distance_km):
+    alert = data['congestionLevel'] not in NORMAL_TRAFFIC
+    return Fact(proximity(distance_km) + alert, "traffic", road,
+                f"{place.capitalize()}|{road}|{data['averageSpeed']}|{data['congestionLevel']}")
+
+
+def forecast_fact(place, road, data, distance_km):
+    """Premier bouchon prévu sur une route aujourd'hui fluide (None si rien de prévu)."""
+    if data['congestionLevel'] in JAM_LEVELS:
+        return None
+    for point in data.get('forecast') or []:
+        if point['expectedCongestion'] in JAM_LEVELS and point['expectedSpeed'] is not None:
+            return Fact(proximity(distance_km) + 1, "forecast", road,
+                        f"{place.capitalize()}|{road}|{point['minutesAhead']}|{round(point['expectedSpeed'])}|"
+                        f"{point['expectedCongestion']}")
+    return None
+
+
+def air_fact(place, data, distance_km):
+    alert = data['aqi'] >= AQI_ALERT
+    return Fact(proximity(distance_km) + alert, "air", data['station'],
+                f"{place.capitalize()}|{data['station']}|{data['aqi']}|{data['status']}|{distance_km:.1f}")
+
+
+def build_context(facts, budget, notes=()):
+    """Tableaux compacts des faits les plus pertinents tenant dans budget tokens.
+
+    Les notes (ex: capteurs indisponibles) sont toujours gardées, à la fin.
+    Renvoie (texte, nombre de faits omis).
+    """
+    # Un capteur cité pour deux quartiers n'apparaît qu'une fois (le plus pertinent)
+    best = {}
+    for fact in facts:
+        id_ = (fact.table, fact.key)
+        if id_ not in best or fact.score > best[id_].score:
+            best[id_] = fact
+
+    used = sum(estimate_tokens(n) + 1 for n in notes)
+    kept = {table: [] for table in TABLES}
+    dropped = 0
+    for fact in sorted(best.values(), key=lambda f: -f.score):
+        cost = estimate_tokens(fact.row) + 1
+        if not kept[fact.table]:
+            cost += estimate_tokens(TABLES[fact.table]) + 1
+        if used + cost > budget:
+            dropped += 1
+            continue
+        kept[fact.table].append(fact.row)
+        used += cost
+
+    lines = []
+    for table, rows in kept.items():
+        if rows:
+            lines.append(TABLES[table])
+            lines.extend(rows)
+    if dropped:
+        lines.append(f"({dropped} faits moins pertinents omis)")
+    lines.extend(notes)
+    return "\n".join(lines), dropped
+
+
+class FragmentCache:
+    """Petit cache LRU (ex: faits d'un quartier pour une version de la photo de la ville)."""
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
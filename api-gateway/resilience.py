@@ -0,0 +1,203 @@
+"""Résilience des appels de la Gateway vers les microservices.
+
+Pour chaque backend :
+  - un disjoncteur (fermé -> ouvert après N échecs de suite -> semi-ouvert :
+    quelques appels de test, puis refermé ou rouvert) ;
+  - un délai max adaptatif, calculé sur les latences observées (p99 x facteur) ;
+  - en option, des requêtes "hedged" pour les lectures idempotentes : si la
+    réponse tarde au-delà du p95, on relance un second appel et on garde le
+    premier qui répond.
+
+Configuration par variables d'environnement (BREAKER_*, TIMEOUT_*, HEDGE_*).
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '5'))
+BREAKER_RESET_S = float(os.getenv('BREAKER_RESET_S', '10'))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv('BREAKER_HALF_OPEN_CALLS', '1'))
+
+TIMEOUT_MIN_S = float(os.getenv('TIMEOUT_MIN_S', '2'))
+TIMEOUT_MAX_S = float(os.getenv('TIMEOUT_MAX_S', '10'))
+TIMEOUT_P99_FACTOR = float(os.getenv('TIMEOUT_P99_FACTOR', '3'))
+
+HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', '0') == '1'
+HEDGE_MIN_DELAY_S = float(os.getenv('HEDGE_MIN_DELAY_S', '0.01'))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+BACKENDS = {}
+
+REJECTED = metrics.Counter("smartcity_backend_rejected_total",
+                           "Appels refusés par le disjoncteur (backend considéré indisponible).", ["backend"])
+HEDGES = metrics.Counter("smartcity_backend_hedges_total",
+                         "Seconds appels lancés (hedging) et lequel a répondu en premier.", ["backend", "winner"])
+metrics.gauge_function("smartcity_backend_circuit_state",
+                       "État du disjoncteur : 0 fermé, 1 semi-ouvert, 2 ouvert.",
+                       lambda: {(name, ): STATE_VALUES[b.breaker.state] for name, b in BACKENDS.items()},
+                       ["backend"])
+metrics.gauge_function("smartcity_backend_timeout_seconds",
+                       "Délai max actuel (adaptatif) des appels.",
+                       lambda: {(name, ): b.latency.timeout() for name, b in BACKENDS.items()},
+                       ["backend"])
+
+# Threads des appels "hedged" (le premier appel et sa relance tournent en parallèle)
+_pool = ThreadPoolExecutor(max_workers=int(os.getenv('HEDGE_POOL_SIZE', '32')), thread_name_prefix="hedge")
+
+
+class CircuitOpenError(Exception):
+    """Le disjoncteur du backend est ouvert : on n'essaie même pas de l'appeler."""
+
+
+class CircuitBreaker:
+    def __init__(self, failures=BREAKER_FAILURES, reset_s=BREAKER_RESET_S, half_open_calls=BREAKER_HALF_OPEN_CALLS):
+        self.failures = failures
+        self.reset_s = reset_s
+        self.half_open_calls = half_open_calls
+        self.lock = threading.Lock()
+        self._state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+
+    @property
+    def state(self):
+        with self.lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_s:
+            self._state = HALF_OPEN
+            self.probes = 0
+
+    def allow(self):
+        with self.lock:
+            self._refresh()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self.probes < self.half_open_calls:
+                self.probes += 1
+                return True
+            return False
+
+    def record(self, success):
+        with self.lock:
+            if success:
+                self._state = CLOSED
+                self.consecutive_failures = 0
+                return
+            self.consecutive_failures += 1
+            if self._state == HALF_OPEN or self.consecutive_failures >= self.failures:
+                self._state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Latences récentes (s) ; percentiles recalculés toutes les 16 mesures."""
+
+    def __init__(self, window=256):
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.count = 0
+        self.p95 = None
+        self.p99 = None
+
+    def observe(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+            self.count += 1
+            if self.count % 16 == 0:
+                values = sorted(self.samples)
+                self.p95 = values[int(0.95 * (len(values) - 1))]
+                self.p99 = values[int(0.99 * (len(values) - 1))]
+
+    def timeout(self):
+        # Pas assez de mesures : on garde le délai max
+        if self.p99 is None:
+            return TIMEOUT_MAX_S
+        return min(TIMEOUT_MAX_S, max(TIMEOUT_MIN_S, self.p99 * TIMEOUT_P99_FACTOR))
+
+    def hedge_delay(self):
+        if self.p95 is None:
+            return None
+        return max(HEDGE_MIN_DELAY_S, self.p95)
+
+
+class Backend:
+    def __init__(self, name, label, hedge=HEDGE_ENABLED):
+        self.name = name
+        self.label = label
+        self.hedge = hedge
+        self.breaker = CircuitBreaker()
+        self.latency = LatencyTracker()
+        BACKENDS[name] = self
+
+    def _attempt(self, fn, timeout):
+        start = time.perf_counter()
+        try:
+            return fn(timeout)
+        finally:
+            # Les échecs (dont les timeouts) comptent aussi : sinon le délai ne remonterait jamais
+            self.latency.observe(time.perf_counter() - start)
+
+    def _hedged(self, fn, timeout):
+        delay = self.latency.hedge_delay()
+        if delay is None or delay >= timeout:
+            return self._attempt(fn, timeout)
+
+        # copy_context : chaque thread garde le span de traçage courant
+        first = _pool.submit(contextvars.copy_context().run, self._attempt, fn, timeout)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        second = _pool.submit(contextvars.copy_context().run, self._attempt, fn, timeout)
+        pending = {first: "primary", second: "hedge"}
+        error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                winner = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                HEDGES.labels(self.name, winner).inc()
+                return result
+        raise error
+
+    def call(self, fn, idempotent=False, is_failure=None):
+        """Appelle fn(timeout) derrière le disjoncteur.
+
+        is_failure(résultat) permet de compter comme échec une réponse reçue
+        (ex: HTTP 5xx) tout en la renvoyant à l'appelant.
+        """
+        if not self.breaker.allow():
+            REJECTED.labels(self.name).inc()
+            raise CircuitOpenError(f"{self.label} indisponible (disjoncteur ouvert)")
+
+        timeout = self.latency.timeout()
+        try:
+            if idempotent and self.hedge:
+                result = self._hedged(fn, timeout)
+            else:
+                result = self._attempt(fn, timeout)
+        except Exception:
+            self.breaker.record(False)
+            raise
+        self.breaker.record(not (is_failure and is_failure(result)))
+        return result
+
+
+def unavailable():
+    """Libellés des backends dont le disjoncteur n'est pas fermé."""
+    return [b.label for b in BACKENDS.values() if b.breaker.state != CLOSED]
@@ -0,0 +1,171 @@
+"""Cache partagé entre les workers de la Gateway (uvicorn --workers N).
+
+Un dossier en mémoire (tmpfs, ex: /dev/shm) tient lieu de Redis local : une
+valeur = un fichier pickle, écrit à côté puis renommé (os.replace est atomique :
+un lecteur voit l'ancienne ou la nouvelle valeur, jamais un fichier à moitié
+écrit). Un verrou fcntl désigne le worker "leader" d'une tâche (ex: rafraîchir
+la photo de la ville) ; s'il meurt, le système libère le verrou et un autre
+worker prend la suite. FileSemaphore compte de la même façon des places
+partagées par tous les workers (ex: générations simultanées de l'IA).
+
+Sans SHARED_CACHE_DIR (un seul processus), MemoryStore offre la même interface.
+Le dossier doit être privé (mkdtemp) : les valeurs sont relues avec pickle.
+"""
+import fcntl
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryStore:
+    shared = False
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, max_age=None):
+        with self.lock:
+            entry = self.items.get(key)
+        if entry is None:
+            return None
+        value, written_at = entry
+        if max_age is not None and time.time() - written_at > max_age:
+            return None
+        return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = (value, time.time())
+
+    def try_lead(self, name):
+        return True
+
+
+class FileStore:
+    shared = True
+    SWEEP_EVERY = 256  # écritures entre deux nettoyages des fichiers expirés
+    SWEEP_AGE_S = 3600
+
+    def __init__(self, directory):
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        self.directory = directory
+        # Dernière valeur lue par clé (avec sa date de fichier) : un fichier inchangé n'est pas relu
+        self.memo = OrderedDict()
+        self.lock = threading.Lock()
+        self.leases = {}
+        self.writes = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key.replace(os.sep, "_"))
+
+    def get(self, key, max_age=None):
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if max_age is not None and time.time() - stat.st_mtime > max_age:
+            return None
+        with self.lock:
+            memo = self.memo.get(key)
+        if memo is not None and memo[0] == stat.st_mtime_ns:
+            return memo[1]
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None
+        with self.lock:
+            self.memo[key] = (stat.st_mtime_ns, value)
+            self.memo.move_to_end(key)
+            while len(self.memo) > 256:
+                self.memo.popitem(last=False)
+        return value
+
+    def put(self, key, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.writes += 1
+        if self.writes % self.SWEEP_EVERY == 0:
+            self.sweep(self.SWEEP_AGE_S)
+
+    def sweep(self, max_age):
+        """Supprime les valeurs plus vieilles que max_age secondes."""
+        limit = time.time() - max_age
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.is_file() and not entry.name.endswith(".lock") and entry.stat().st_mtime < limit:
+                    os.unlink(entry.path)
+            except FileNotFoundError:
+                pass
+
+    def try_lead(self, name):
+        """Vrai si ce processus détient (ou vient d'obtenir) le verrou name."""
+        if name in self.leases:
+            return True
+        fd = os.open(self._path(name + ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        # Gardé ouvert jusqu'à la fin du processus
+        self.leases[name] = fd
+        return True
+
+    def semaphore(self, name, count):
+        return FileSemaphore(self.directory, name, count)
+
+
+class FileSemaphore:
+    """count places partagées entre processus : une place = un fichier verrouillé (flock).
+
+    Le verrou appartient au descripteur ouvert : deux threads d'un même processus
+    se comptent comme deux processus, et la place d'un worker mort est libérée.
+    """
+    POLL_S = (0.005, 0.05)  # attente entre deux essais : de la plus courte à la plus longue
+
+    def __init__(self, directory, name, count):
+        self.paths = [os.path.join(directory, f"{name}.{i}.lock") for i in range(count)]
+
+    def try_acquire(self):
+        """Jeton (descripteur) d'une place libre, sinon None."""
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def acquire(self, deadline=None):
+        """Attend une place jusqu'à deadline (time.monotonic()) ; None si le délai est dépassé."""
+        pause = self.POLL_S[0]
+        while True:
+            fd = self.try_acquire()
+            if fd is not None:
+                return fd
+            if deadline is not None and time.monotonic() + pause > deadline:
+                return None
+            time.sleep(pause)
+            pause = min(pause * 2, self.POLL_S[1])
+
+    def release(self, fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def open_store():
+    directory = os.getenv('SHARED_CACHE_DIR')
+    return FileStore(directory) if directory else MemoryStore()
@@ -0,0 +1,221 @@
+"""Photo de la ville en mémoire, rafraîchie en tâche de fond.
+
+Un SnapshotRefresher interroge périodiquement chaque source (air, trafic,
+mobilité, énergie) et publie une nouvelle CitySnapshot. Une photo n'est jamais
+modifiée après sa création : on la remplace d'un seul coup (simple affectation),
+les lecteurs n'ont donc besoin d'aucun verrou.
+
+Avec plusieurs workers (store partagé, voir sharedcache.py), un seul worker
+interroge les services ; les autres relisent sa photo dans le store.
+
+Avec le bus d'événements (voir eventbus.py), apply() remplace une source par une
+copie mise à jour dès qu'un service publie un changement, sans tout réinterroger.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+
+import tracing
+from geo import SpatialIndex
+
+
+class Source:
+    """Données d'un type de capteur, à jour à fetched_at (lecture seule).
+
+    version : date du dernier changement des données ; fetched_at peut avancer sans
+    elle quand le service confirme que rien n'a changé (signe de vie sur le bus).
+    """
+    __slots__ = ("kind", "records", "items", "index", "fetched_at", "version")
+
+    def __init__(self, kind, records, fetched_at, version=None):
+        records = tuple(records)
+        items = {}
+        index = SpatialIndex()
+        for key, lat, lon, payload in records:
+            items[key] = payload
+            if lat is not None and lon is not None:
+                index.insert(key, lat, lon, payload)
+        self.kind = kind
+        self.records = records  # Pour la partager avec les autres workers
+        self.items = MappingProxyType(items)
+        self.index = index
+        self.fetched_at = fetched_at
+        self.version = fetched_at if version is None else version
+
+    def renewed(self, fetched_at):
+        """Mêmes données (et même index), confirmées à fetched_at."""
+        copy = object.__new__(Source)
+        for name in self.__slots__:
+            setattr(copy, name, getattr(self, name))
+        copy.fetched_at = fetched_at
+        return copy
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+
+class CitySnapshot:
+    __slots__ = ("sources", "built_at")
+
+    def __init__(self, sources, built_at):
+        self.sources = MappingProxyType(dict(sources))
+        self.built_at = built_at
+
+    def source(self, kind, max_age=None):
+        """La source demandée, ou None si elle manque ou est plus vieille que max_age secondes."""
+        src = self.sources.get(kind)
+        if src is None or (max_age is not None and src.age() > max_age):
+            return None
+        return src
+
+    def index(self, kind):
+        src = self.sources.get(kind)
+        return src.index if src is not None else SpatialIndex()
+
+    def age(self):
+        return time.time() - self.built_at
+
+
+class SnapshotRefresher:
+    """fetchers : type -> fonction renvoyant une liste de (clé, lat, lon, payload).
+
+    store : sharedcache.MemoryStore / FileStore ; une photo partagée plus vieille que
+    shared_max_age secondes est ignorée (le leader ne rafraîchit plus : on interroge soi-même).
+    """
+
+    def __init__(self, fetchers, interval, store=None, shared_max_age=None):
+        self.fetchers = fetchers
+        self.interval = interval
+        self.store = store
+        self.shared_max_age = shared_max_age
+        self.current = None
+        self.running = False
+        self.refreshes = 0
+        self.failed = set()  # Sources en échec lors du dernier rafraîchissement
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=len(fetchers), thread_name_prefix="snapshot")
+
+    def _fetch(self, kind):
+        try:
+            return Source(kind, self.fetchers[kind](), time.time())
+        except Exception as e:
+            print(f"⚠️ Photo de la ville : source '{kind}' indisponible ({e})")
+            return None
+
+    def refresh(self, ttl=None):
+        """Interroge toutes les sources en parallèle puis publie la nouvelle photo.
+
+        Avec ttl, ne fait rien si un autre thread vient de la refaire (photo plus jeune que ttl).
+        """
+        with self.lock:
+            if ttl is not None and self.current is not None and self.current.age() <= ttl:
+                return self.current
+            # Span racine hors requête : les appels aux services restent rattachés à une trace
+            with tracing.background_span("snapshot.refresh"):
+                return self._refresh()
+
+    def _refresh(self):
+        """Appelé sous self.lock, dans le span snapshot.refresh."""
+        # Plusieurs workers : seul le leader interroge les services
+        if self.store is not None and self.store.shared and not self.store.try_lead("snapshot"):
+            snapshot = self._load_shared()
+            if snapshot is not None:
+                return snapshot
+        previous = self.current.sources if self.current is not None else {}
+        # copy_context : chaque fetch garde le span de traçage courant (snapshot.refresh)
+        futures = {kind: self.pool.submit(contextvars.copy_context().run, self._fetch, kind)
+                   for kind in self.fetchers}
+        sources, failed = {}, set()
+        for kind, future in futures.items():
+            src = future.result()
+            if src is None:
+                # Source en échec : on garde l'ancienne version (son âge le dira)
+                failed.add(kind)
+                src = previous.get(kind)
+            if src is not None:
+                sources[kind] = src
+        self.failed = failed
+        self.current = CitySnapshot(sources, time.time())
+        self.refreshes += 1
+        if self.store is not None and self.store.shared:
+            self.store.put("snapshot", {
+                "built_at": self.current.built_at,
+                "failed": failed,
+                "sources": {kind: (src.records, src.fetched_at) for kind, src in sources.items()},
+            })
+        return self.current
+
+    def _load_shared(self):
+        """Photo publiée par le leader, ou None si absente ou trop vieille."""
+        shared = self.store.get("snapshot", max_age=self.shared_max_age)
+        if shared is None:
+            return None
+        current = self.current
+        if current is not None and current.built_at == shared["built_at"]:
+            return current
+        sources = {}
+        for kind, (records, fetched_at) in shared["sources"].items():
+            # Source inchangée (ou déjà plus récente grâce au bus) : on garde l'objet et son index
+            old = current.sources.get(kind) if current is not None else None
+            sources[kind] = old if old is not None and old.version >= fetched_at \
+                else Source(kind, records, fetched_at)
+        self.failed = set(shared["failed"])
+        self.current = CitySnapshot(sources, shared["built_at"])
+        return self.current
+
+    def apply(self, kind, changes, at):
+        """Met à jour la source kind avec changes = [(clé, enregistrement ou None si supprimé)]
+        reçus du bus, à jour à at. Sans changement, la source est seulement confirmée.
+
+        Une nouvelle Source (et son index) est construite par lot d'événements, pas par
+        événement. Sans photo ou sans cette source, ne fait rien : refresh() s'en chargera.
+        """
+        with self.lock:
+            current = self.current
+            src = current.sources.get(kind) if current is not None else None
+            if src is None:
+                return None
+            at = max(at, src.fetched_at)
+            if changes:
+                records = {record[0]: record for record in src.records}
+                for key, record in changes:
+                    if record is None:
+                        records.pop(key, None)
+                    else:
+                        records[key] = record
+                src = Source(kind, records.values(), at, version=time.time())
+            else:
+                src = src.renewed(at)
+            self.current = CitySnapshot({**current.sources, kind: src}, current.built_at)
+            return self.current
+
+    def get(self, lazy_ttl, retry_s):
+        """Photo courante. Sans thread de fond, elle est refaite à la demande après lazy_ttl
+        secondes (retry_s si une source manquait)."""
+        snapshot = self.current
+        if snapshot is None:
+            return self.refresh(ttl=float("inf"))
+        if not self.running:
+            ttl = retry_s if self.failed else lazy_ttl
+            if snapshot.age() > ttl:
+                return self.refresh(ttl=ttl)
+        return snapshot
+
+    def _loop(self):
+        # Photo déjà faite (ex: pendant la chauffe) : on attend le prochain tour
+        next_run = time.monotonic() + (self.interval if self.current is not None else 0)
+        while self.running:
+            time.sleep(max(0.0, next_run - time.monotonic()))
+            self.refresh()
+            next_run += self.interval
+
+    def start(self):
+        if self.running or self.interval <= 0:
+            return
+        self.running = True
+        threading.Thread(target=self._loop, daemon=True, name="snapshot-refresher").start()
+
+    def stop(self):
+        self.running = False
@@ -0,0 +1,48 @@
+"""Profil de démarrage de la Gateway et clients créés au premier usage.
+
+Importé en premier par main.py : STARTED marque le début des imports. Chaque
+étape (imports, WSDL SOAP, canal gRPC, première photo de la ville) est
+chronométrée dans PHASES, exposée sur /ready et /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+STARTED = time.perf_counter()
+
+PHASES = {}  # étape -> secondes, dans l'ordre d'exécution
+READY = threading.Event()  # posé quand la chauffe est terminée
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PHASES[name] = time.perf_counter() - start
+
+
+def since_start():
+    return time.perf_counter() - STARTED
+
+
+class Lazy:
+    """Valeur construite au premier get() par un seul thread. Un échec n'est pas mémorisé :
+    le get() suivant réessaie."""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+        self.value = None
+        self.lock = threading.Lock()
+
+    def get(self):
+        value = self.value
+        if value is None:
+            with self.lock:
+                if self.value is None:
+                    with phase(f"init.{self.name}"):
+                        self.value = self.factory()
+                value = self.value
+        return value
@@ -0,0 +1,144 @@
+"""Benchmark des exports en masse : protobuf (bulk.proto) contre XML / JSON.
+
+Lance les services Air (SOAP), Trafic (GraphQL) et Mobilité (REST) avec
+MOCK_EXTRA_SENSORS capteurs générés en plus, puis lit chaque source comme le fait
+la photo de la ville de la Gateway, dans l'ancien format puis en protobuf :
+taille de la réponse, durée de l'appel HTTP (service + transfert) et durée du
+décodage jusqu'aux enregistrements de la photo (mêmes fonctions que la Gateway).
+
+    python benchmarks/bench_bulk.py --sensors 0,2000 --repeat 10
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import requests
+
+from run_bench import BACKENDS, RESULTS_DIR, ROOT, Process, git_revision, wait_for_port
+
+# Mêmes adresses que run_bench.start_gateway (127.0.0.1 : pas de détour par ::1)
+os.environ.setdefault("SOAP_URL", "http://127.0.0.1:8001/?wsdl")
+os.environ.setdefault("GRAPHQL_URL", "http://127.0.0.1:5000/graphql")
+os.environ.setdefault("REST_URL", "http://127.0.0.1:8002/transports")
+sys.path.insert(0, os.path.join(ROOT, "api-gateway"))
+import main as gateway  # noqa: E402
+
+SERVICES = ("soap_air", "graphql_traffic", "rest_mobility")
+
+
+def text_and_bulk(session):
+    """Source -> format -> (appel HTTP renvoyant la réponse, décodage -> enregistrements)."""
+    from lxml import etree
+
+    soap = gateway.SOAP_CLIENT.get()
+    envelope = etree.tostring(soap.create_message(soap.service, "list_stations"))
+    list_stations = soap.service._binding.get("list_stations")
+    pb = gateway.BULK_PB2.get()
+    horizon = gateway.TRAFFIC_FORECAST_MIN
+
+    def soap_post():
+        return session.post(gateway.SOAP_URL.split("?")[0], data=envelope,
+                            headers={"Content-Type": "text/xml; charset=utf-8", "SOAPAction": '"list_stations"'})
+
+    return {
+        "air": {
+            "xml": (soap_post,
+                    lambda res: [gateway.air_record(s) for s in soap.service._binding.process_reply(
+                        soap, list_stations, res)]),
+            "protobuf": (lambda: session.get(gateway.SOAP_BULK_URL),
+                         lambda res: gateway.air_records_pb(pb.AirStations.FromString(res.content))),
+        },
+        "traffic": {
+            "json": (lambda: session.post(gateway.GRAPHQL_URL, json={
+                        "query": gateway.TRAFFIC_LIST_QUERY, "variables": {"horizon": horizon}}),
+                     lambda res: [gateway.traffic_record(r) for r in json.loads(res.content)["data"]["allTraffic"]]),
+            "protobuf": (lambda: session.get(gateway.GRAPHQL_BULK_URL, params={"horizon_minutes": horizon}),
+                         lambda res: gateway.traffic_records_pb(pb.TrafficRoads.FromString(res.content))),
+        },
+        "mobility": {
+            "json": (lambda: session.get(gateway.REST_URL),
+                     lambda res: [gateway.mobility_record(t) for t in json.loads(res.content)]),
+            "protobuf": (lambda: session.get(gateway.REST_BULK_URL),
+                         lambda res: gateway.mobility_records_pb(pb.Transports.FromString(res.content))),
+        },
+    }
+
+
+def measure(fetch, decode, repeat):
+    fetch_s, decode_s = [], []
+    for i in range(repeat + 1):
+        start = time.perf_counter()
+        res = fetch()
+        res.raise_for_status()
+        fetched = time.perf_counter()
+        records = decode(res)
+        if i:  # Le premier tour chauffe les connexions et les caches
+            fetch_s.append(fetched - start)
+            decode_s.append(time.perf_counter() - fetched)
+    return {
+        "records": len(records),
+        "bytes": len(res.content),
+        "fetch_ms": round(statistics.median(fetch_s) * 1000, 2),
+        "decode_ms": round(statistics.median(decode_s) * 1000, 3),
+        "total_ms": round((statistics.median(fetch_s) + statistics.median(decode_s)) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des exports en masse (protobuf vs XML / JSON)")
+    parser.add_argument("--sensors", default="0,2000", help="Capteurs générés en plus par service (ex: 0,2000)")
+    parser.add_argument("--repeat", type=int, default=10, help="Lectures mesurées par (source, format)")
+    parser.add_argument("--history-days", default="7", help="Historique de trafic simulé (jours, pour la prévision)")
+    parser.add_argument("--output", default=None, help="Fichier JSON de résultat")
+    args = parser.parse_args()
+
+    runs = []
+    for extra in [int(n) for n in args.sensors.split(",") if n]:
+        env = {"MOCK_EXTRA_SENSORS": str(extra), "TRAFFIC_HISTORY_DAYS": args.history_days}
+        processes = [Process(name, *BACKENDS[name][:3], env=env).start() for name in SERVICES]
+        try:
+            for process in processes:
+                wait_for_port(process.port, timeout=120)
+            with requests.Session() as session:
+                for source, formats in text_and_bulk(session).items():
+                    results = {fmt: measure(fetch, decode, args.repeat) for fmt, (fetch, decode) in formats.items()}
+                    text_fmt, text = next(iter(results.items()))
+                    bulk = results["protobuf"]
+                    for fmt, result in results.items():
+                        result.update({"source": source, "format": fmt, "extra_sensors": extra})
+                        runs.append(result)
+                    print(f"  {source:<9} {text['records']:>6} capteurs  {text_fmt:<4} {text['bytes']:>9} o "
+                          f"{text['fetch_ms']:>8.1f} + {text['decode_ms']:>8.2f} ms   protobuf {bulk['bytes']:>9} o "
+                          f"{bulk['fetch_ms']:>8.1f} + {bulk['decode_ms']:>8.2f} ms   "
+                          f"taille x{text['bytes'] / bulk['bytes']:.1f}, total x{text['total_ms'] / bulk['total_ms']:.1f}")
+        finally:
+            for process in processes:
+                process.stop()
+
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "traffic_forecast_min": gateway.TRAFFIC_FORECAST_MIN,
+        },
+        "runs": runs,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['git']}-bulk.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Résultats : {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Benchmark du bus d'événements capteurs (voir api-gateway/eventbus.py).
+
+1. Le bus seul : un éditeur publie N événements, un abonné les reçoit (bus local
+   au processus, puis via le broker TCP), avec et sans envoi par lots. On mesure
+   le débit (événements/s) et la latence publication -> réception, à pleine
+   vitesse puis à un débit fixe (--rate).
+2. De bout en bout (--e2e) : services et Gateway lancés en local, un transport
+   change de statut (PUT REST) et on mesure le temps avant que /api/mobility de
+   la Gateway le montre, d'abord en interrogation périodique (sans bus) puis avec
+   le bus.
+
+    python benchmarks/bench_events.py --events 20000 --e2e
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+import requests
+
+from run_bench import (BACKENDS, RESULTS_DIR, ROOT, Process, git_revision, percentile, start_gateway,
+                       wait_for_gateway, wait_for_port)
+
+sys.path.insert(0, os.path.join(ROOT, "api-gateway"))
+import eventbus  # noqa: E402
+
+PAYLOAD = {"roadId": "GP9", "congestionLevel": "Saturé", "averageSpeed": 15, "latitude": 36.845, "longitude": 10.27}
+
+
+def start_broker(port):
+    broker = Process("broker", "api-gateway", ["eventbus.py", "--host", "127.0.0.1", "--port", str(port)], port)
+    broker.start()
+    wait_for_port(port)
+    return broker
+
+
+def summary(latencies_s):
+    ms = sorted(s * 1000 for s in latencies_s)
+    return {"p50_ms": percentile(ms, 50), "p95_ms": percentile(ms, 95), "p99_ms": percentile(ms, 99),
+            "max_ms": ms[-1] if ms else None}
+
+
+# --- 1. LE BUS SEUL ---
+def run_bus(publisher, subscriber, events, batched, rate=None):
+    """Publie events événements (rate par seconde, ou au plus vite) et attend leur réception."""
+    latencies, done = [], threading.Event()
+
+    def on_events(batch):
+        now = time.time()
+        latencies.extend(now - e.published_at for e in batch if e.key is not None)
+        if len(latencies) >= events:
+            done.set()
+
+    subscriber.subscribe("sensor.", on_events)
+    if subscriber.remote:
+        while not subscriber.connected:
+            time.sleep(0.01)
+        time.sleep(0.1)  # Le broker a reçu l'abonnement
+
+    start = time.perf_counter()
+    for i in range(events):
+        if rate:
+            time.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        publisher.publish("sensor.traffic", f"R{i % 1000}", PAYLOAD)
+        if not batched:
+            publisher.flush()  # Une écriture par événement
+    received = done.wait(timeout=120)
+    elapsed = time.perf_counter() - start
+    return {
+        "events": events,
+        "received": len(latencies),
+        "complete": received,
+        "elapsed_s": round(elapsed, 3),
+        "events_per_s": round(len(latencies) / elapsed, 1),
+        "batches": publisher.batches,
+        **summary(latencies),
+    }
+
+
+def bench_bus(args):
+    runs = []
+    broker = start_broker(args.broker_port)
+    try:
+        for transport in ("local", "broker"):
+            for batched in (False, True):
+                for rate in (None, args.rate):
+                    options = {} if batched else {"batch_max": 1, "batch_ms": 0}
+                    if transport == "local":
+                        publisher = subscriber = eventbus.LocalBus("bench", **options)
+                    else:
+                        publisher = eventbus.BrokerBus("bench-pub", "127.0.0.1", args.broker_port, **options)
+                        subscriber = eventbus.BrokerBus("bench-sub", "127.0.0.1", args.broker_port)
+                    events = args.events if rate is None else int(args.rate * args.paced_duration)
+                    result = run_bus(publisher, subscriber, events, batched, rate)
+                    result.update({"transport": transport, "batched": batched, "rate": rate})
+                    runs.append(result)
+                    print(f"  {transport:<7} {'lots' if batched else 'unitaire':<9} "
+                          f"{'max' if rate is None else str(rate) + '/s':>7} {result['events_per_s']:>10.0f} évt/s  "
+                          f"p50={result['p50_ms']:.2f}ms  p99={result['p99_ms']:.2f}ms  "
+                          f"écritures={result['batches']}")
+                    if transport == "broker":
+                        publisher.close()
+                        subscriber.close()
+    finally:
+        broker.stop()
+    return runs
+
+
+# --- 2. DE BOUT EN BOUT (SERVICE -> GATEWAY) ---
+def wait_for_status(base_url, transport_id, status, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        data = session.get(f"{base_url}/api/mobility", timeout=5).json()["data"]
+        if any(t["id"] == transport_id and t["status"] == status for t in data):
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def bench_e2e(args):
+    base_url = f"http://127.0.0.1:{args.gateway_port}"
+    rest_url = f"http://127.0.0.1:{BACKENDS['rest_mobility'][2]}/transports"
+    runs = []
+    for mode in ("polling", "events"):
+        env = {"EVENT_BUS_URL": f"tcp://127.0.0.1:{args.broker_port}"} if mode == "events" else {}
+        processes = []
+        try:
+            if mode == "events":
+                processes.append(start_broker(args.broker_port))
+            for name, (cwd, cmd, port, _) in BACKENDS.items():
+                processes.append(Process(name, cwd, cmd, port, env=env).start())
+            for process in processes:
+                wait_for_port(process.port)
+            processes.append(start_gateway(args.gateway_port, "http://127.0.0.1:9/api/generate", extra_env=env))
+            wait_for_gateway(base_url)
+
+            transport = requests.get(f"{rest_url}/1", timeout=5).json()
+            latencies, missed = [], 0
+            for i in range(args.updates):
+                # Instant aléatoire : pas de synchronisation avec le cycle d'interrogation
+                time.sleep(random.uniform(0.2, 1.0))
+                transport["status"] = f"Retard {i + 1}min"
+                start = time.perf_counter()
+                requests.put(f"{rest_url}/1", json=transport, timeout=5).raise_for_status()
+                if wait_for_status(base_url, 1, transport["status"]):
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    missed += 1
+            result = {"mode": mode, "updates": args.updates, "missed": missed, **summary(latencies),
+                      "mean_ms": sum(latencies) * 1000 / len(latencies) if latencies else None}
+            runs.append(result)
+            print(f"  {mode:<8} visible dans la Gateway : p50={result['p50_ms']:.0f}ms  "
+                  f"p95={result['p95_ms']:.0f}ms  max={result['max_ms']:.0f}ms  manqués={missed}")
+        finally:
+            for process in reversed(processes):
+                process.stop()
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du bus d'événements capteurs")
+    parser.add_argument("--events", type=int, default=20000, help="Événements publiés au plus vite")
+    parser.add_argument("--rate", type=int, default=1000, help="Débit fixe (événements/s) pour la latence")
+    parser.add_argument("--paced-duration", type=float, default=2.0, help="Secondes au débit fixe")
+    parser.add_argument("--broker-port", type=int, default=7401)
+    parser.add_argument("--e2e", action="store_true", help="Mesurer aussi service -> Gateway")
+    parser.add_argument("--updates", type=int, default=10, help="Changements de statut mesurés (--e2e)")
+    parser.add_argument("--gateway-port", type=int, default=8000)
+    parser.add_argument("--output", default=None, help="Fichier JSON de résultat")
+    args = parser.parse_args()
+
+    print(f"📡 Bus seul ({args.events} événements au plus vite, puis {args.rate}/s)")
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "batch_ms": eventbus.BATCH_MS,
+            "batch_max": eventbus.BATCH_MAX,
+        },
+        "bus": bench_bus(args),
+    }
+    if args.e2e:
+        print(f"🔁 De bout en bout ({args.updates} changements de statut)")
+        report["e2e"] = bench_e2e(args)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['git']}-events.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Résultats : {output}")
+
+
+if __name__ == "__main__":
+    main()
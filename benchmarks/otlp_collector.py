@@ -0,0 +1,111 @@
+"""Collecteur OTLP/HTTP (JSON) minimal pour le développement local.
+
+Reçoit les spans envoyés par les services (TRACE_OTLP_URL=http://127.0.0.1:4318/v1/traces)
+et les ajoute à un fichier JSON lines, au même format que TRACE_FILE. L'option
+--show affiche ensuite les traces les plus lentes sous forme d'arbre :
+
+    python otlp_collector.py --port 4318 --file traces.jsonl
+    python otlp_collector.py --show traces.jsonl --top 5
+"""
+import argparse
+import json
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+KINDS = {1: "internal", 2: "server", 3: "client"}
+
+
+def otlp_to_spans(payload):
+    """Aplatit un export OTLP JSON en spans au format de tracing.py."""
+    spans = []
+    for resource in payload.get("resourceSpans", []):
+        service = next((a["value"].get("stringValue") for a in resource.get("resource", {}).get("attributes", [])
+                        if a["key"] == "service.name"), "unknown")
+        for scope in resource.get("scopeSpans", []):
+            for s in scope.get("spans", []):
+                start, end = int(s["startTimeUnixNano"]), int(s["endTimeUnixNano"])
+                status = s.get("status", {})
+                spans.append({
+                    "trace_id": s["traceId"],
+                    "span_id": s["spanId"],
+                    "parent_id": s.get("parentSpanId") or None,
+                    "service": service,
+                    "name": s["name"],
+                    "kind": KINDS.get(s.get("kind"), "internal"),
+                    "start_ns": start,
+                    "end_ns": end,
+                    "duration_ms": (end - start) / 1e6,
+                    "attributes": {a["key"]: next(iter(a["value"].values())) for a in s.get("attributes", [])},
+                    "error": status.get("message") if status.get("code") == 2 else None,
+                })
+    return spans
+
+
+def serve(host, port, path):
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            spans = otlp_to_spans(json.loads(self.rfile.read(length) or b"{}"))
+            with lock, open(path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(s, ensure_ascii=False) + "\n" for s in spans))
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"📡 Collecteur OTLP sur http://{host}:{port}/v1/traces -> {path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+def show(path, top=5):
+    traces = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            s = json.loads(line)
+            traces[s["trace_id"]].append(s)
+
+    def root_duration(spans):
+        return max(s["duration_ms"] for s in spans)
+
+    for trace_id, spans in sorted(traces.items(), key=lambda t: -root_duration(t[1]))[:top]:
+        ids = {s["span_id"] for s in spans}
+        children = defaultdict(list)
+        for s in spans:
+            children[s["parent_id"] if s["parent_id"] in ids else None].append(s)
+        t0 = min(s["start_ns"] for s in spans)
+        print(f"\n🔎 trace {trace_id} ({root_duration(spans):.1f} ms, {len(spans)} spans)")
+
+        def walk(parent, depth):
+            for s in sorted(children[parent], key=lambda s: s["start_ns"]):
+                offset = (s["start_ns"] - t0) / 1e6
+                error = f"  ❌ {s['error']}" if s["error"] else ""
+                print(f"  {'  ' * depth}{s['name']:<45} {s['service']:<26} +{offset:8.1f} ms {s['duration_ms']:8.1f} ms{error}")
+                walk(s["span_id"], depth + 1)
+
+        walk(None, 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4318)
+    parser.add_argument("--file", default="traces.jsonl", help="Fichier de sortie")
+    parser.add_argument("--show", default=None, help="Afficher les traces d'un fichier au lieu d'écouter")
+    parser.add_argument("--top", type=int, default=5, help="Nombre de traces affichées (--show)")
+    args = parser.parse_args()
+
+    if args.show:
+        show(args.show, args.top)
+    else:
+        serve(args.host, args.port, args.file)
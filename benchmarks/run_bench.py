@@ -0,0 +1,371 @@
+"""Benchmark de bout en bout de la Gateway Smart City.
+
+Démarre les 4 services (SOAP, GraphQL, REST, gRPC), un faux Ollama et la Gateway
+en local, puis envoie du trafic sur les routes du dashboard et du chat à
+plusieurs niveaux de concurrence. Le résultat (RPS, percentiles de latence,
+appels aux backends par requête) est enregistré en JSON dans benchmarks/results/
+pour comparer deux commits :
+
+    python benchmarks/run_bench.py --concurrency 1,8,32 --duration 10
+    python benchmarks/run_bench.py --compare benchmarks/results/<ancien>.json
+
+Avec --workers 1,2,4, le banc est rejoué pour chaque nombre de workers de la
+Gateway (cache partagé entre workers) : débit et appels aux backends par worker.
+
+Le démarrage à froid de la Gateway (lancement -> première réponse, puis -> /ready)
+est mesuré au début de chaque banc local.
+
+Avec --external, les services déjà lancés (ex: docker compose) sont utilisés tels
+quels et les appels aux backends ne sont pas comptés.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from stub_ollama import OllamaStub
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# Une ligne de log d'accès HTTP (wsgiref, werkzeug, uvicorn) = un appel reçu
+HTTP_ACCESS = r'"(GET|POST|PUT|DELETE) [^"]* HTTP/1\.[01]" \d{3}'
+
+# Nom -> (dossier, commande, port, motif de log compté comme un appel)
+BACKENDS = {
+    "soap_air": ("service-soap-air", ["main.py"], 8001, HTTP_ACCESS),
+    "graphql_traffic": ("service-graphql-user", ["main.py"], 5000, HTTP_ACCESS),
+    "rest_mobility": ("service-rest-mobility", ["main.py"], 8002, HTTP_ACCESS),
+    "grpc_energy": ("service-grpc-emergency", ["server.py"], 50051, r"Demande reçue|Liste des bâtiments"),
+}
+
+CHAT_QUESTIONS = [
+    "Comment aller à la Marsa ?",
+    "Il y a des bouchons vers Ben Arous ?",
+    "Quel temps fait-il au Bardo ?",
+    "Je vais au Lac puis à Ennasr",
+]
+
+# Nom -> (méthode, chemin, corps JSON en fonction du numéro de requête)
+ROUTES = {
+    "air": ("GET", "/api/air/Tunis", None),
+    "traffic": ("GET", "/api/traffic/GP9", None),
+    "mobility": ("GET", "/api/mobility", None),
+    "energy": ("GET", "/api/energy/Batiment_A", None),
+    "chat": ("POST", "/api/chat", lambda i: {"question": CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)]}),
+}
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    pos = (len(sorted_values) - 1) * q / 100.0
+    lo = int(pos)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (pos - lo)
+
+
+def wait_for_port(port, timeout=30.0, host="127.0.0.1"):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Port {port} toujours fermé après {timeout}s")
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+# --- 1. PROCESSUS LOCAUX ---
+class Process:
+    """Un service lancé en sous-processus ; compte les lignes de log qui matchent un motif."""
+
+    def __init__(self, name, cwd, args, port, pattern=None, env=None):
+        self.name = name
+        self.cwd = os.path.join(ROOT, cwd)
+        self.args = args
+        self.port = port
+        self.pattern = re.compile(pattern) if pattern else None
+        self.env = {**os.environ, "PYTHONUNBUFFERED": "1", **(env or {})}
+        self.calls = 0
+        self.proc = None
+
+    def start(self):
+        self.proc = subprocess.Popen([sys.executable, *self.args], cwd=self.cwd, env=self.env,
+                                     stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        threading.Thread(target=self._read_logs, daemon=True).start()
+        return self
+
+    def _read_logs(self):
+        for line in self.proc.stdout:
+            if self.pattern and self.pattern.search(line):
+                self.calls += 1
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+def start_gateway(port, ollama_url, workers=1, shared_dir=None, extra_env=None):
+    env = {
+        "SOAP_URL": "http://127.0.0.1:8001/?wsdl",
+        "GRAPHQL_URL": "http://127.0.0.1:5000/graphql",
+        "REST_URL": "http://127.0.0.1:8002/transports",
+        "GRPC_HOST": "127.0.0.1:50051",
+        "OLLAMA_URL": ollama_url,
+        "GATEWAY_WORKERS": str(workers),
+        **(extra_env or {}),
+    }
+    if shared_dir:
+        env["SHARED_CACHE_DIR"] = shared_dir
+    args = ["-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--log-level", "warning", "--workers", str(workers)]
+    return Process("gateway", "api-gateway", args, port, env=env).start()
+
+
+def wait_for_gateway(base_url, started=None, timeout=60.0):
+    """Attend que /ready réponde 200 (chauffe terminée).
+
+    Renvoie le démarrage à froid mesuré depuis started (time.monotonic() au lancement) :
+    secondes jusqu'à la première réponse HTTP, puis jusqu'à "prête".
+    """
+    started = started if started is not None else time.monotonic()
+    first_response = None
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            res = requests.get(f"{base_url}/ready", timeout=1)
+            if first_response is None:
+                first_response = time.monotonic() - started
+            # 404 : Gateway sans /ready (ancien commit), prête dès qu'elle répond
+            if res.status_code in (200, 404):
+                return {"first_response_s": round(first_response, 3),
+                        "ready_s": round(time.monotonic() - started, 3)}
+        except requests.RequestException:
+            pass
+        time.sleep(0.02)
+    raise TimeoutError("La Gateway ne répond pas")
+
+
+# --- 2. GÉNÉRATEUR DE CHARGE ---
+def run_load(base_url, route, concurrency, duration):
+    """concurrency clients en boucle fermée pendant duration secondes."""
+    method, path, body = ROUTES[route]
+    url = base_url + path
+    deadline = time.monotonic() + duration
+    counter = iter(range(10 ** 9))
+    lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        latencies, errors = [], 0
+        while time.monotonic() < deadline:
+            with lock:
+                i = next(counter)
+            start = time.perf_counter()
+            try:
+                res = session.request(method, url, json=body(i) if body else None, timeout=120)
+                ok = res.status_code == 200
+            except requests.RequestException:
+                ok = False
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += not ok
+        return latencies, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: client(), range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(ms for lat, _ in results for ms in lat)
+    errors = sum(e for _, e in results)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else None,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else None,
+    }
+
+
+# --- 3. COMPARAISON ENTRE DEUX RÉSULTATS ---
+def compare(old, new):
+    print(f"\n📈 {old['meta']['git']} -> {new['meta']['git']}")
+    print(f"{'route':<10}{'conc':>6}{'wrk':>5}{'rps':>12}{'Δrps':>9}{'p95 ms':>12}{'Δp95':>9}")
+    previous = {(r["route"], r["concurrency"], r.get("workers", 1)): r for r in old["runs"]}
+    for run in new["runs"]:
+        before = previous.get((run["route"], run["concurrency"], run.get("workers", 1)))
+        if not before:
+            continue
+
+        def delta(key):
+            if not before.get(key) or run.get(key) is None:
+                return "   n/a"
+            return f"{(run[key] - before[key]) / before[key] * 100:+7.1f}%"
+
+        print(f"{run['route']:<10}{run['concurrency']:>6}{run.get('workers', 1):>5}{run['rps']:>12.1f}{delta('rps'):>9}"
+              f"{run['p95_ms'] or 0:>12.1f}{delta('p95_ms'):>9}")
+
+    before, after = old["meta"].get("cold_start"), new["meta"].get("cold_start")
+    if before and after:
+        print(f"🧊 démarrage à froid : première réponse {before['first_response_s']:.2f} -> "
+              f"{after['first_response_s']:.2f} s, prête {before['ready_s']:.2f} -> {after['ready_s']:.2f} s")
+
+
+# --- 4. ORCHESTRATION ---
+def run_routes(base_url, routes, levels, args, backends, ollama, workers):
+    runs = []
+    for route in routes:
+        if args.warmup:
+            run_load(base_url, route, 1, args.warmup)
+        for concurrency in levels:
+            calls_before = {name: p.calls for name, p in backends.items()}
+            llm_before = ollama.stats()["calls"] if ollama else 0
+
+            result = run_load(base_url, route, concurrency, args.duration)
+
+            calls = {name: p.calls - calls_before[name] for name, p in backends.items()}
+            if ollama:
+                calls["ollama"] = ollama.stats()["calls"] - llm_before
+            result.update({
+                "route": route,
+                "concurrency": concurrency,
+                "workers": workers,
+                "backend_calls": calls,
+                "backend_calls_per_request": {
+                    name: round(n / result["requests"], 3) if result["requests"] else None
+                    for name, n in calls.items()
+                },
+            })
+            runs.append(result)
+            print(f"  {route:<9} c={concurrency:<4} w={workers:<2} {result['rps']:>9.1f} req/s  "
+                  f"p50={result['p50_ms'] or 0:.1f}ms  p95={result['p95_ms'] or 0:.1f}ms  "
+                  f"p99={result['p99_ms'] or 0:.1f}ms  erreurs={result['errors']}  appels={calls}")
+    return runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la Gateway Smart City")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="Routes à tester (air,traffic,...)")
+    parser.add_argument("--concurrency", default="1,8,32", help="Niveaux de concurrence")
+    parser.add_argument("--duration", type=float, default=10.0, help="Secondes par (route, niveau)")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Secondes de chauffe par route")
+    parser.add_argument("--gateway-port", type=int, default=8000)
+    parser.add_argument("--ollama-delay", type=float, default=0.2, help="Secondes par génération (faux Ollama)")
+    parser.add_argument("--ollama-parallel", type=int, default=4, help="Générations simultanées (faux Ollama)")
+    parser.add_argument("--workers", default="1", help="Nombres de workers de la Gateway à comparer (ex: 1,2,4)")
+    parser.add_argument("--gateway-env", action="append", default=[], metavar="CLÉ=VALEUR",
+                        help="Variable d'environnement de la Gateway (ex: LLM_ANSWER_TTL_S=30 pour mesurer le cache)")
+    parser.add_argument("--external", action="store_true",
+                        help="Utiliser les services et la Gateway déjà lancés")
+    parser.add_argument("--output", default=None, help="Fichier JSON de résultat")
+    parser.add_argument("--compare", default=None, help="Résultat précédent à comparer")
+    args = parser.parse_args()
+
+    routes = [r for r in args.routes.split(",") if r]
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    workers_levels = [1] if args.external else [int(w) for w in args.workers.split(",") if w]
+    gateway_env = dict(item.split("=", 1) for item in args.gateway_env)
+    # Sans cache des réponses de l'IA : la route chat mesure la file d'attente et les générations,
+    # pas 4 questions servies depuis le cache
+    gateway_env.setdefault("LLM_ANSWER_TTL_S", "0")
+    base_url = f"http://127.0.0.1:{args.gateway_port}"
+
+    backends, gateway, ollama, cold_starts, runs = {}, None, None, {}, []
+    try:
+        if not args.external:
+            ollama = OllamaStub(port=0, delay=args.ollama_delay, parallel=args.ollama_parallel).start()
+            for name, (cwd, cmd, port, pattern) in BACKENDS.items():
+                backends[name] = Process(name, cwd, cmd, port, pattern).start()
+            for process in backends.values():
+                wait_for_port(process.port)
+
+        for workers in workers_levels:
+            # Plusieurs workers : cache partagé dans un dossier en mémoire (comme `python main.py`)
+            shared_dir = tempfile.mkdtemp(prefix="smartcity-bench-", dir="/dev/shm" if os.path.isdir("/dev/shm")
+                                          else None) if workers > 1 and not args.external else None
+            try:
+                if not args.external:
+                    started = time.monotonic()
+                    gateway = start_gateway(args.gateway_port, ollama.url, workers, shared_dir, gateway_env)
+                    cold_starts[workers] = wait_for_gateway(base_url, started)
+                    print(f"🧊 Démarrage à froid ({workers} worker(s)) : première réponse en "
+                          f"{cold_starts[workers]['first_response_s']:.2f} s, "
+                          f"prête en {cold_starts[workers]['ready_s']:.2f} s")
+                else:
+                    wait_for_gateway(base_url)
+                print(f"🚀 Banc prêt sur {base_url} (services {'externes' if args.external else 'locaux'}, "
+                      f"{workers} worker(s))")
+                runs.extend(run_routes(base_url, routes, levels, args, backends, ollama, workers))
+            finally:
+                if gateway:
+                    gateway.stop()
+                    gateway = None
+                if shared_dir:
+                    shutil.rmtree(shared_dir, ignore_errors=True)
+    finally:
+        if gateway:
+            gateway.stop()
+        for process in backends.values():
+            process.stop()
+        if ollama:
+            ollama.stop()
+
+    report = {
+        "meta": {
+            "git": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "external": args.external,
+            "duration_s": args.duration,
+            "ollama_delay_s": args.ollama_delay,
+            "llm_answer_ttl_s": None if args.external else float(gateway_env["LLM_ANSWER_TTL_S"]),
+            "workers": workers_levels,
+            "cold_start": cold_starts.get(workers_levels[0]),
+            "cold_start_by_workers": {str(w): c for w, c in cold_starts.items()},
+        },
+        "runs": runs,
+    }
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['meta']['git']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"💾 Résultats : {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
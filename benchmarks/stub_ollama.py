@@ -0,0 +1,96 @@
+"""Faux serveur Ollama pour les benchmarks (POST /api/generate).
+
+Simule le coût d'un vrai modèle : un délai fixe par génération plus un coût par
+token de prompt, avec un nombre limité de générations simultanées
+(équivalent de OLLAMA_NUM_PARALLEL).
+
+    python stub_ollama.py --port 11434 --delay 0.2 --parallel 4
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class OllamaStub:
+    def __init__(self, host="127.0.0.1", port=11434, delay=0.2, ms_per_token=0.05, parallel=4):
+        self.delay = delay
+        self.ms_per_token = ms_per_token
+        self.slots = threading.Semaphore(parallel)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.prompt_chars = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api/generate"
+
+    def stats(self):
+        with self.lock:
+            return {"calls": self.calls, "prompt_chars": self.prompt_chars}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                prompt = body.get("prompt", "")
+                # Approximation grossière : 1 token ~ 4 caractères
+                prompt_tokens = max(1, len(prompt) // 4)
+
+                with stub.slots:
+                    time.sleep(stub.delay + prompt_tokens * stub.ms_per_token / 1000)
+                with stub.lock:
+                    stub.calls += 1
+                    stub.prompt_chars += len(prompt)
+
+                payload = json.dumps({
+                    "model": body.get("model", "stub"),
+                    "response": f"Réponse simulée ({prompt_tokens} tokens de contexte).",
+                    "done": True,
+                    "prompt_eval_count": prompt_tokens,
+                    "eval_count": 16,
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--delay", type=float, default=0.2, help="Secondes par génération")
+    parser.add_argument("--ms-per-token", type=float, default=0.05, help="Coût du prompt (ms/token)")
+    parser.add_argument("--parallel", type=int, default=4, help="Générations simultanées")
+    args = parser.parse_args()
+
+    stub = OllamaStub(args.host, args.port, args.delay, args.ms_per_token, args.parallel)
+    print(f"🧪 Faux Ollama sur {stub.url}")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        stub.stop()
@@ -0,0 +1,214 @@
+"""Historique des vitesses par tronçon (colonnes NumPy) et analyses vectorisées.
+
+Pour chaque route : deux tableaux alignés, horodatages (int64, secondes) et
+vitesses (float32), toujours triés par date. Tous les calculs (profil horaire,
+percentiles, prévision) se font en une passe NumPy sur des mois d'échantillons.
+
+Prévision : moyenne saisonnière du même créneau de la semaine (5 min), corrigée
+par l'écart récent à cette moyenne (celui de la mesure en direct si elle est
+connue, sinon l'EWMA des résidus), écart qui s'estompe avec l'horizon. Ce qui ne dépend que de
+l'historique d'une route (fit) n'est recalculé que quand il a changé.
+"""
+import os
+import threading
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+SAMPLE_STEP_S = int(os.getenv('TRAFFIC_SAMPLE_STEP_S', '300'))
+HISTORY_DAYS = int(os.getenv('TRAFFIC_HISTORY_DAYS', '90'))
+# Heure locale de Tunis (UTC+1, pas d'heure d'été)
+TZ_OFFSET_S = int(float(os.getenv('TRAFFIC_TZ_OFFSET_H', '1')) * 3600)
+
+EWMA_ALPHA = 0.3
+EWMA_SAMPLES = 12  # Résidus pris en compte (1 h à 5 min)
+DAMPING = 0.9  # L'écart récent perd 10 % par pas d'échantillonnage dans le futur
+
+WEEK_S = 7 * 86400
+FREE_FLOW_KMH = 70.0
+
+# Vitesse / vitesse libre -> niveau de congestion (mêmes libellés que la base)
+LEVELS = ((0.15, "Bloqué"), (0.35, "Saturé"), (0.6, "Modéré"))
+JAM_LEVELS = {"Bloqué", "Saturé", "Bouché"}
+
+
+def congestion_levels(speeds, free_flow):
+    ratio = np.asarray(speeds, dtype=np.float64) / max(free_flow, 1.0)
+    return np.select([ratio < limit for limit, _ in LEVELS], [label for _, label in LEVELS], "Fluide")
+
+
+def synthetic_history(road_id, now, days=HISTORY_DAYS, step=SAMPLE_STEP_S):
+    """Historique simulé : pointes du matin et du soir (plus légères le week-end) + bruit.
+    Graine tirée du nom de la route : même historique à chaque démarrage."""
+    rng = np.random.default_rng(zlib.crc32(road_id.encode()))
+    end = now - now % step
+    ts = np.arange(end - days * 86400, end + 1, step, dtype=np.int64)
+    local = ts + TZ_OFFSET_S
+    hour = (local % 86400) / 3600.0
+    weekday = (local // 86400 + 3) % 7  # Le 01/01/1970 était un jeudi ; 0 = lundi
+    depth_am, depth_pm = rng.uniform(0.35, 0.85, size=2)
+    rush = depth_am * np.exp(-((hour - 8.0) / 1.2) ** 2) + depth_pm * np.exp(-((hour - 17.5) / 1.5) ** 2)
+    rush *= np.where(weekday >= 5, 0.35, 1.0)
+    speed = FREE_FLOW_KMH * (1.0 - np.clip(rush, 0.0, 0.95)) + rng.normal(0.0, 3.0, size=ts.size)
+    return ts, np.clip(speed, 3.0, FREE_FLOW_KMH + 15.0).astype(np.float32)
+
+
+class RoadHistory:
+    """Tableaux de taille fixe, triés par date ; les plus vieux échantillons sortent en premier."""
+
+    def __init__(self, capacity):
+        self.ts = np.zeros(capacity, dtype=np.int64)
+        self.speed = np.zeros(capacity, dtype=np.float32)
+        self.size = 0
+        self.version = 0  # +1 à chaque ajout : invalide le modèle de prévision en cache
+        self.fitted = None  # (version, modèle)
+        self.lock = threading.Lock()
+
+    def extend(self, ts, speed):
+        ts = np.asarray(ts, dtype=np.int64)[-self.ts.size:]
+        speed = np.asarray(speed, dtype=np.float32)[-self.ts.size:]
+        n = ts.size
+        with self.lock:
+            overflow = max(0, self.size + n - self.ts.size)
+            if overflow:
+                # Décalage en bloc (memmove) : quelques centaines de Ko, une fois toutes les 5 min
+                keep = self.size - overflow
+                self.ts[:keep] = self.ts[overflow:self.size]
+                self.speed[:keep] = self.speed[overflow:self.size]
+                self.size = keep
+            self.ts[self.size:self.size + n] = ts
+            self.speed[self.size:self.size + n] = speed
+            self.size += n
+            self.version += 1
+
+    def window(self, since=None):
+        """Copie (horodatages, vitesses) des échantillons depuis since (tout l'historique si None)."""
+        with self.lock:
+            start = 0 if since is None else int(np.searchsorted(self.ts[:self.size], since))
+            return self.ts[start:self.size].copy(), self.speed[start:self.size].copy()
+
+    def model(self):
+        """Paramètres de prévision (voir fit), gardés tant que l'historique ne change pas."""
+        cached = self.fitted
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        with self.lock:
+            version = self.version
+            ts, speed = self.ts[:self.size].copy(), self.speed[:self.size].copy()
+        model = fit(ts, speed)
+        self.fitted = (version, model)
+        return model
+
+
+# --- ANALYSES ---
+def _group_mean(keys, values, size):
+    sums = np.bincount(keys, weights=values, minlength=size)
+    counts = np.bincount(keys, minlength=size)
+    means = np.divide(sums, counts, out=np.full(size, np.nan), where=counts > 0)
+    return means, counts
+
+
+def hourly_profile(ts, speed):
+    """Vitesse moyenne et nombre d'échantillons par heure de la journée (0-23)."""
+    hours = ((ts + TZ_OFFSET_S) % 86400) // 3600
+    return _group_mean(hours, speed, 24)
+
+
+def percentiles(speed, qs):
+    if speed.size == 0:
+        return np.full(len(qs), np.nan)
+    return np.percentile(speed, qs)
+
+
+def week_slot(ts):
+    return ((ts + TZ_OFFSET_S) % WEEK_S) // SAMPLE_STEP_S
+
+
+# Tout ce qui ne dépend que de l'historique, calculé une fois par version de celui-ci
+Model = namedtuple("Model", "seasonal free_flow correction last_ts")
+
+
+def fit(ts, speed):
+    """Moyenne par créneau de la semaine (repli : moyenne de l'heure, puis globale), vitesse
+    libre et écart récent à la saison (EWMA : le plus récent pèse le plus). None sans historique."""
+    if ts.size == 0:
+        return None
+    seasonal, _ = _group_mean(week_slot(ts), speed, WEEK_S // SAMPLE_STEP_S)
+    hourly, _ = hourly_profile(ts, speed)
+    hour_of_slot = (np.arange(seasonal.size) * SAMPLE_STEP_S % 86400) // 3600
+    seasonal = np.where(np.isnan(seasonal), hourly[hour_of_slot], seasonal)
+    seasonal = np.where(np.isnan(seasonal), float(speed.mean()), seasonal)
+
+    recent_ts, recent = ts[-EWMA_SAMPLES:], speed[-EWMA_SAMPLES:]
+    residuals = recent - seasonal[week_slot(recent_ts)]
+    weights = (1.0 - EWMA_ALPHA) ** np.arange(residuals.size)[::-1]
+    correction = float(np.dot(weights, residuals) / weights.sum())
+    return Model(seasonal, float(np.percentile(speed, 95)), correction, int(ts[-1]))
+
+
+def forecast(model, now, horizon_s, step_s, current=None):
+    """Vitesses prévues à now + step_s, now + 2*step_s, ... jusqu'à horizon_s.
+
+    current : vitesse mesurée en direct à now, pas encore dans l'historique (None si inconnue).
+    Renvoie (horodatages, vitesses).
+    """
+    future = now + np.arange(step_s, horizon_s + 1, step_s, dtype=np.int64)
+    if model is None:
+        return future, np.full(future.size, np.nan)
+
+    # 1. Écart récent : celui de la mesure en direct (résidu le plus récent, entier à now),
+    #    sinon l'EWMA de l'historique depuis le dernier échantillon ; amorti au fil des pas
+    if current is not None:
+        correction = (float(current) - model.seasonal[week_slot(now)]) * DAMPING ** ((future - now) / SAMPLE_STEP_S)
+    else:
+        correction = model.correction * DAMPING ** ((future - model.last_ts) / SAMPLE_STEP_S)
+    # 2. Saison du créneau visé + écart
+    return future, np.clip(model.seasonal[week_slot(future)] + correction, 0.0, None)
+
+
+# --- HISTORIQUE DE TOUTES LES ROUTES ---
+class TrafficHistory:
+    def __init__(self, roads, days=HISTORY_DAYS, now=None):
+        now = int(now if now is not None else time.time())
+        self.capacity = days * 86400 // SAMPLE_STEP_S + 1
+        self.roads = {}
+        for road_id in roads:
+            self.roads[road_id] = RoadHistory(self.capacity)
+            self.roads[road_id].extend(*synthetic_history(road_id, now, days))
+
+    def record(self, road_id, speed, at=None):
+        road = self.roads.get(road_id)
+        if road is None:
+            road = self.roads[road_id] = RoadHistory(self.capacity)
+        road.extend([int(at if at is not None else time.time())], [speed])
+
+    def window(self, road_id, days=None):
+        road = self.roads.get(road_id)
+        if road is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        return road.window(None if days is None else int(time.time()) - days * 86400)
+
+    def forecast(self, road_id, now, horizon_s, step_s, current=None):
+        """(horodatages, vitesses prévues, vitesse libre de référence)."""
+        road = self.roads.get(road_id)
+        model = road.model() if road is not None else None
+        future, predicted = forecast(model, now, horizon_s, step_s, current)
+        return future, predicted, model.free_flow if model is not None else FREE_FLOW_KMH
+
+    def start_sampler(self, current_speeds, interval=SAMPLE_STEP_S):
+        """Ajoute la vitesse actuelle de chaque route toutes les interval secondes.
+        current_speeds : fonction renvoyant {route: vitesse}."""
+        def loop():
+            while True:
+                # Modèles de prévision refaits ici (au démarrage puis après chaque échantillon)
+                # plutôt que par la prochaine requête
+                for road in list(self.roads.values()):
+                    road.model()
+                time.sleep(interval - time.time() % interval)
+                now = int(time.time())
+                for road_id, speed in current_speeds().items():
+                    self.record(road_id, speed, now)
+
+        threading.Thread(target=loop, daemon=True, name="traffic-sampler").start()
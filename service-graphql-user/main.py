@@ -1,16 +1,184 @@
+import math
+import os
+import random
+import time
+from datetime import datetime, timezone
+
 import strawberry
-from flask import Flask
+from flask import Flask, Response, request
+from strawberry.extensions import SchemaExtension
 from strawberry.flask.views import GraphQLView
-from typing import Optional
+from typing import List, Optional
+
+import bulk_pb2
+import eventbus
+import metrics
+import tracing
+import history
+
+
+# Mode debug (python main.py) : Flask relance ce script dans un processus fils et le parent,
+# qui ne fait que surveiller les fichiers, ne doit lancer ni historique ni tâches de fond
+DEBUG = True
+
+
+def serving_process():
+    """Vrai dans le processus qui sert les requêtes (faux dans le parent du rechargeur)."""
+    return not (DEBUG and __name__ == '__main__') or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+
+
+# Simulation de la base de données
+# Simulation trafic Grand Tunis (lat/lon = point représentatif du tronçon)
+traffic_mock_db = {
+    "GP9": {"congestion_level": "Saturé", "average_speed": 15, "lat": 36.8450, "lon": 10.2700},  # Route de la Marsa
+    "Route X": {"congestion_level": "Fluide", "average_speed": 70, "lat": 36.8250, "lon": 10.1500},  # Bardo / Manar
+    "Z4": {"congestion_level": "Bloqué", "average_speed": 5, "lat": 36.7900, "lon": 10.1850},  # Centre-Ville / Sortie Sud
+    "X20": {"congestion_level": "Modéré", "average_speed": 40, "lat": 36.8550, "lon": 10.1800},  # Ennasr / Ariana
+    "GP1": {"congestion_level": "Bouché", "average_speed": 20, "lat": 36.7550, "lon": 10.2350},  # Ben Arous / Mourouj
+    "Lac": {"congestion_level": "Fluide", "average_speed": 50, "lat": 36.8350, "lon": 10.2450}  # Les Berges du Lac
+}
+
+
+# Routes supplémentaires générées autour de Tunis (tests de charge, 0 par défaut)
+MOCK_EXTRA_SENSORS = int(os.getenv('MOCK_EXTRA_SENSORS', '0'))
+rng = random.Random(42)
+for i in range(MOCK_EXTRA_SENSORS):
+    speed = rng.randint(5, 80)
+    traffic_mock_db[f"R{i}"] = {
+        "congestion_level": str(history.congestion_levels([speed], history.FREE_FLOW_KMH)[0]),
+        "average_speed": speed,
+        "lat": round(36.8 + rng.uniform(-0.1, 0.1), 5), "lon": round(10.2 + rng.uniform(-0.1, 0.1), 5),
+    }
+
+
+# Historique des vitesses (plusieurs mois simulés au démarrage, puis un échantillon toutes les 5 min)
+def current_speeds():
+    return {road_id: data['average_speed'] for road_id, data in traffic_mock_db.items()}
+
+
+traffic_history = history.TrafficHistory(traffic_mock_db if serving_process() else {})
+if serving_process():
+    # La mesure actuelle est le dernier échantillon connu
+    for road_id, speed in current_speeds().items():
+        traffic_history.record(road_id, speed)
+    traffic_history.start_sampler(current_speeds)
+
+
+# Bus d'événements : chaque changement est publié sur "sensor.traffic" (voir eventbus.py),
+# avec la prévision recalculée sur EVENT_FORECAST_MIN minutes (pas de 15 min, comme /bulk/traffic)
+BUS = eventbus.open_bus("service-graphql-traffic")
+EVENT_FORECAST_MIN = int(os.getenv('EVENT_FORECAST_MIN', '60'))
+
+
+def set_traffic(road_id, average_speed, congestion_level=None):
+    data = traffic_mock_db[road_id]
+    data['average_speed'] = average_speed
+    data['congestion_level'] = congestion_level or str(history.congestion_levels([average_speed],
+                                                                                 history.FREE_FLOW_KMH)[0])
+    BUS.publish("sensor.traffic", road_id, {
+        "roadId": road_id, "congestionLevel": data['congestion_level'], "averageSpeed": average_speed,
+        "latitude": data['lat'], "longitude": data['lon'],
+        "forecast": [{"minutesAhead": minutes, "expectedSpeed": speed, "expectedCongestion": level}
+                     for minutes, speed, level in forecast_points(road_id, EVENT_FORECAST_MIN, 15)],
+    })
+    return make_traffic_data(road_id, data)
+
+
+# Capteurs simulés (SENSOR_UPDATES_PER_S) : la vitesse d'une route varie un peu
+def simulate_speed():
+    road_id = random.choice(list(traffic_mock_db))
+    set_traffic(road_id, min(90, max(3, traffic_mock_db[road_id]['average_speed'] + random.randint(-5, 5))))
+
+
+def nan_to_none(value):
+    return None if math.isnan(value) else round(float(value), 1)
 
 
 # 1. Définition du Modèle de données (Schema)
 # Avec Strawberry, on utilise des classes Python normales avec des types
+@strawberry.type
+class HourlySpeed:
+    hour: int
+    average_speed: Optional[float]
+    samples: int
+
+
+@strawberry.type
+class SpeedPercentile:
+    percentile: float
+    speed: Optional[float]
+
+
+@strawberry.type
+class ForecastPoint:
+    minutes_ahead: int
+    at: str  # ISO 8601 (UTC)
+    expected_speed: Optional[float]
+    expected_congestion: str
+
+
 @strawberry.type
 class TrafficData:
     road_id: str
     congestion_level: str
     average_speed: int
+    latitude: float
+    longitude: float
+
+    # Analyses calculées à la demande sur l'historique (days = fenêtre en jours)
+    @strawberry.field
+    def hourly_profile(self, days: int = 28) -> List[HourlySpeed]:
+        ts, speed = traffic_history.window(self.road_id, clamp_days(days))
+        means, counts = history.hourly_profile(ts, speed)
+        return [HourlySpeed(hour=h, average_speed=nan_to_none(means[h]), samples=int(counts[h])) for h in range(24)]
+
+    @strawberry.field
+    def speed_percentiles(self, percentiles: Optional[List[float]] = None, days: int = 28) -> List[SpeedPercentile]:
+        qs = [min(100.0, max(0.0, q)) for q in (percentiles or [10.0, 50.0, 90.0])]
+        _, speed = traffic_history.window(self.road_id, clamp_days(days))
+        return [SpeedPercentile(percentile=q, speed=nan_to_none(v)) for q, v in zip(qs, history.percentiles(speed, qs))]
+
+    @strawberry.field
+    def forecast(self, horizon_minutes: int = 60, step_minutes: int = 15) -> List[ForecastPoint]:
+        now = int(time.time())
+        return [ForecastPoint(minutes_ahead=int((t - now) // 60),
+                              at=datetime.fromtimestamp(int(t), tz=timezone.utc).isoformat(),
+                              expected_speed=nan_to_none(v), expected_congestion=str(level))
+                for t, v, level in road_forecast(self.road_id, now, horizon_minutes, step_minutes)]
+
+
+def road_forecast(road_id, now, horizon_minutes, step_minutes):
+    """[(horodatage, vitesse prévue, niveau prévu)] de now + step à now + horizon."""
+    step = max(history.SAMPLE_STEP_S, step_minutes * 60)
+    horizon = min(max(horizon_minutes * 60, step), 24 * 3600)
+    # La vitesse actuelle (ex: updateTraffic) compte avant même d'entrer dans l'historique
+    data = traffic_mock_db.get(road_id)
+    future, predicted, free_flow = traffic_history.forecast(road_id, now, horizon, step,
+                                                            data['average_speed'] if data else None)
+    return zip(future, predicted, history.congestion_levels(predicted, free_flow))
+
+
+def forecast_points(road_id, horizon_minutes, step_minutes):
+    """[(minutes à venir, vitesse prévue ou None, niveau prévu)] à partir de maintenant (exports, événements)."""
+    if horizon_minutes <= 0:
+        return []
+    now = int(time.time())
+    return [(int((t - now) // 60), nan_to_none(v), str(level))
+            for t, v, level in road_forecast(road_id, now, horizon_minutes, step_minutes)]
+
+
+def clamp_days(days):
+    return min(max(1, days), history.HISTORY_DAYS)
+
+
+def make_traffic_data(road_id, data):
+    return TrafficData(
+        road_id=road_id,
+        congestion_level=data['congestion_level'],
+        average_speed=data['average_speed'],
+        latitude=data['lat'],
+        longitude=data['lon']
+    )
 
 
 # 2. Définition des Requêtes (Query)
@@ -18,33 +186,48 @@ class TrafficData:
 class Query:
     @strawberry.field
     def get_traffic(self, road_id: str) -> Optional[TrafficData]:
-        # Simulation de la base de données
-        # Simulation trafic Grand Tunis
-        traffic_mock_db = {
-            "GP9": {"congestion_level": "Saturé", "average_speed": 15},  # Route de la Marsa
-            "Route X": {"congestion_level": "Fluide", "average_speed": 70},  # Bardo / Manar
-            "Z4": {"congestion_level": "Bloqué", "average_speed": 5},  # Centre-Ville / Sortie Sud
-            "X20": {"congestion_level": "Modéré", "average_speed": 40},  # Ennasr / Ariana
-            "GP1": {"congestion_level": "Bouché", "average_speed": 20},  # Ben Arous / Mourouj
-            "Lac": {"congestion_level": "Fluide", "average_speed": 50}  # Les Berges du Lac
-        }
-
         data = traffic_mock_db.get(road_id)
 
         if data:
-            return TrafficData(
-                road_id=road_id,
-                congestion_level=data['congestion_level'],
-                average_speed=data['average_speed']
-            )
+            return make_traffic_data(road_id, data)
         return None
 
+    # Tous les tronçons (utilisé par la Gateway pour l'index géographique)
+    @strawberry.field
+    def all_traffic(self) -> List[TrafficData]:
+        return [make_traffic_data(road_id, data) for road_id, data in traffic_mock_db.items()]
+
+
+# Mise à jour envoyée par un capteur (niveau déduit de la vitesse si absent)
+@strawberry.type
+class Mutation:
+    @strawberry.mutation
+    def update_traffic(self, road_id: str, average_speed: int,
+                       congestion_level: Optional[str] = None) -> Optional[TrafficData]:
+        if road_id not in traffic_mock_db:
+            return None
+        return set_traffic(road_id, average_speed, congestion_level)
+
 
-# 3. Création du Schéma global
-schema = strawberry.Schema(query=Query)
+# 3. Traçage : un span par resolver de Query (seulement si la requête est tracée)
+tracing.init("service-graphql-traffic")
 
-# 4. Configuration de l'application Flask
+
+class ResolverTracing(SchemaExtension):
+    def resolve(self, _next, root, info, *args, **kwargs):
+        if tracing.current() is None or info.parent_type.name != "Query":
+            return _next(root, info, *args, **kwargs)
+        with tracing.span(f"graphql.resolve {info.parent_type.name}.{info.field_name}"):
+            return _next(root, info, *args, **kwargs)
+
+
+# 4. Création du Schéma global
+schema = strawberry.Schema(query=Query, mutation=Mutation, extensions=[ResolverTracing] if tracing.enabled() else [])
+
+# 5. Configuration de l'application Flask
 app = Flask(__name__)
+# Métriques Prometheus sur /metrics
+app.wsgi_app = metrics.WsgiMiddleware(tracing.WsgiMiddleware(app.wsgi_app), routes=("/graphql", "/bulk/traffic"))
 
 # Route pour l'interface GraphQL
 app.add_url_rule(
@@ -52,7 +235,27 @@ app.add_url_rule(
     view_func=GraphQLView.as_view("graphql_view", schema=schema),
 )
 
+
+# Export en masse (protobuf, voir bulk.proto) : lu par la Gateway pour sa photo de la ville,
+# sans passer par l'exécution GraphQL champ par champ
+@app.route("/bulk/traffic")
+def export_traffic():
+    horizon = request.args.get("horizon_minutes", 60, type=int)
+    step = request.args.get("step_minutes", 15, type=int)
+    message = bulk_pb2.TrafficRoads()
+    for road_id, data in list(traffic_mock_db.items()):
+        road = message.roads.add(road_id=road_id, congestion_level=data['congestion_level'],
+                                 average_speed=data['average_speed'], latitude=data['lat'], longitude=data['lon'])
+        for minutes, speed, level in forecast_points(road_id, horizon, step):
+            road.forecast.add(minutes_ahead=minutes, expected_speed=speed, expected_congestion=level)
+    return Response(message.SerializeToString(), mimetype="application/x-protobuf")
+
+
 if __name__ == '__main__':
     print("Serveur GraphQL (Strawberry) démarré sur http://0.0.0.0:5000/graphql")
+    # Seul le processus qui sert les requêtes publie (voir serving_process)
+    if serving_process():
+        BUS.keep_alive("sensor.traffic")
+        eventbus.simulate(simulate_speed)
     # IMPORTANT : host="0.0.0.0" pour Docker !
-    app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
+    app.run(host="0.0.0.0", port=5000, debug=DEBUG)
@@ -24,7 +24,7 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0c\x65nergy.proto\x12\x06\x65nergy\"$\n\rEnergyRequest\x12\x13\n\x0b\x62uilding_id\x18\x01 \x01(\t\"N\n\x0e\x45nergyResponse\x12\x13\n\x0b\x62uilding_id\x18\x01 \x01(\t\x12\x17\n\x0f\x63onsumption_kwh\x18\x02 \x01(\x02\x12\x0e\n\x06status\x18\x03 \x01(\t2O\n\rEnergyService\x12>\n\rGetEnergyData\x12\x15.energy.EnergyRequest\x1a\x16.energy.EnergyResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x0c\x65nergy.proto\x12\x06\x65nergy\"$\n\rEnergyRequest\x12\x13\n\x0b\x62uilding_id\x18\x01 \x01(\t\"s\n\x0e\x45nergyResponse\x12\x13\n\x0b\x62uilding_id\x18\x01 \x01(\t\x12\x17\n\x0f\x63onsumption_kwh\x18\x02 \x01(\x02\x12\x0e\n\x06status\x18\x03 \x01(\t\x12\x10\n\x08latitude\x18\x04 \x01(\x01\x12\x11\n\tlongitude\x18\x05 \x01(\x01\"\x13\n\x11\x45nergyListRequest\"7\n\nEnergyList\x12)\n\tbuildings\x18\x01 \x03(\x0b\x32\x16.energy.EnergyResponse2\x90\x01\n\rEnergyService\x12>\n\rGetEnergyData\x12\x15.energy.EnergyRequest\x1a\x16.energy.EnergyResponse\x12?\n\x0eListEnergyData\x12\x19.energy.EnergyListRequest\x1a\x12.energy.EnergyListb\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
@@ -34,7 +34,11 @@ if not _descriptor._USE_C_DESCRIPTORS:
   _globals['_ENERGYREQUEST']._serialized_start=24
   _globals['_ENERGYREQUEST']._serialized_end=60
   _globals['_ENERGYRESPONSE']._serialized_start=62
-  _globals['_ENERGYRESPONSE']._serialized_end=140
-  _globals['_ENERGYSERVICE']._serialized_start=142
-  _globals['_ENERGYSERVICE']._serialized_end=221
+  _globals['_ENERGYRESPONSE']._serialized_end=177
+  _globals['_ENERGYLISTREQUEST']._serialized_start=179
+  _globals['_ENERGYLISTREQUEST']._serialized_end=198
+  _globals['_ENERGYLIST']._serialized_start=200
+  _globals['_ENERGYLIST']._serialized_end=255
+  _globals['_ENERGYSERVICE']._serialized_start=258
+  _globals['_ENERGYSERVICE']._serialized_end=402
 # @@protoc_insertion_point(module_scope)
@@ -1,19 +1,74 @@
 import grpc
 from concurrent import futures
+import os
+import random
 import time
 
 # Import des fichiers générés automatiquement
 import energy_pb2
 import energy_pb2_grpc
+import eventbus
+import metrics
+import tracing
+
+# Port HTTP où Prometheus vient lire /metrics
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9101'))
+
+GRPC_REQUESTS = metrics.Counter("smartcity_grpc_requests_total", "Appels gRPC reçus.", ["method", "code"])
+GRPC_LATENCY = metrics.Histogram("smartcity_grpc_request_duration_seconds", "Durée des appels gRPC.", ["method"])
+GRPC_IN_FLIGHT = metrics.Gauge("smartcity_grpc_requests_in_flight", "Appels gRPC en cours.")
 
 # Simulation d'une base de données
 ENERGY_DB = {
-    "Batiment_A": {"kwh": 150.5, "status": "Normal"},
-    "Batiment_B": {"kwh": 450.0, "status": "Surcharge"},
-    "Batiment_C": {"kwh": 30.2, "status": "Économie"},
+    "Batiment_A": {"kwh": 150.5, "status": "Normal", "lat": 36.8065, "lon": 10.1815},
+    "Batiment_B": {"kwh": 450.0, "status": "Surcharge", "lat": 36.8420, "lon": 10.2400},
+    "Batiment_C": {"kwh": 30.2, "status": "Économie", "lat": 36.8600, "lon": 10.1900},
 }
 
 
+# Bus d'événements : chaque nouveau relevé est publié sur "sensor.energy" (voir eventbus.py)
+BUS = eventbus.open_bus("service-grpc-energy")
+
+
+def energy_status(kwh):
+    return "Surcharge" if kwh > 400 else "Économie" if kwh < 50 else "Normal"
+
+
+# Bâtiments supplémentaires générés autour de Tunis (tests de charge, 0 par défaut)
+MOCK_EXTRA_SENSORS = int(os.getenv('MOCK_EXTRA_SENSORS', '0'))
+rng = random.Random(42)
+for i in range(MOCK_EXTRA_SENSORS):
+    kwh = round(rng.uniform(20, 500), 1)
+    ENERGY_DB[f"Batiment_{i}"] = {"kwh": kwh, "status": energy_status(kwh),
+                                  "lat": round(36.8 + rng.uniform(-0.1, 0.1), 5),
+                                  "lon": round(10.2 + rng.uniform(-0.1, 0.1), 5)}
+
+
+def record_reading(building_id, kwh):
+    data = ENERGY_DB[building_id]
+    data.update(kwh=kwh, status=energy_status(kwh))
+    BUS.publish("sensor.energy", building_id, {
+        "building_id": building_id, "consumption_kwh": kwh, "status": data['status'],
+        "latitude": data['lat'], "longitude": data['lon'],
+    })
+
+
+# Capteurs simulés (SENSOR_UPDATES_PER_S) : la consommation d'un bâtiment varie un peu
+def simulate_reading():
+    building_id = random.choice(list(ENERGY_DB))
+    record_reading(building_id, round(max(0.0, ENERGY_DB[building_id]['kwh'] * random.uniform(0.95, 1.05)), 1))
+
+
+def make_energy_response(building_id, data):
+    return energy_pb2.EnergyResponse(
+        building_id=building_id,
+        consumption_kwh=data['kwh'],
+        status=data['status'],
+        latitude=data['lat'],
+        longitude=data['lon']
+    )
+
+
 class EnergyService(energy_pb2_grpc.EnergyServiceServicer):
     def GetEnergyData(self, request, context):
         building_id = request.building_id
@@ -22,11 +77,7 @@ class EnergyService(energy_pb2_grpc.EnergyServiceServicer):
         data = ENERGY_DB.get(building_id)
 
         if data:
-            return energy_pb2.EnergyResponse(
-                building_id=building_id,
-                consumption_kwh=data['kwh'],
-                status=data['status']
-            )
+            return make_energy_response(building_id, data)
         else:
             # Si le bâtiment n'existe pas, on renvoie des valeurs par défaut
             return energy_pb2.EnergyResponse(
@@ -35,9 +86,80 @@ class EnergyService(energy_pb2_grpc.EnergyServiceServicer):
                 status="Inconnu"
             )
 
+    def ListEnergyData(self, request, context):
+        print("Liste des bâtiments demandée")
+        return energy_pb2.EnergyList(
+            buildings=[make_energy_response(b, data) for b, data in ENERGY_DB.items()]
+        )
+
+
+class TracingInterceptor(grpc.ServerInterceptor):
+    """Ouvre un span serveur par appel, en continuant la trace reçue dans la métadonnée 'traceparent'."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+
+        method = handler_call_details.method
+        traceparent = dict(handler_call_details.invocation_metadata or ()).get("traceparent")
+        inner = handler.unary_unary
+
+        def traced(request, context):
+            with tracing.server_span(method, traceparent):
+                return inner(request, context)
+
+        return grpc.unary_unary_rpc_method_handler(
+            traced,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Compte les appels, leur code de retour, leur durée et ceux en cours."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+
+        method = handler_call_details.method
+        inner = handler.unary_unary
+
+        def measured(request, context):
+            start = time.perf_counter()
+            code = "OK"
+            GRPC_IN_FLIGHT.inc()
+            try:
+                return inner(request, context)
+            except Exception:
+                code = "UNKNOWN"
+                raise
+            finally:
+                GRPC_IN_FLIGHT.dec()
+                if context.code() is not None:
+                    code = context.code().name
+                GRPC_REQUESTS.labels(method, code).inc()
+                GRPC_LATENCY.labels(method).observe(time.perf_counter() - start)
+
+        return grpc.unary_unary_rpc_method_handler(
+            measured,
+            request_deserializer=handler.request_deserializer,
+            response_serializer=handler.response_serializer,
+        )
+
 
 def serve():
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+    tracing.init("service-grpc-energy")
+    metrics.start_http_server(METRICS_PORT)
+    print(f"Métriques Prometheus sur http://0.0.0.0:{METRICS_PORT}/metrics")
+    BUS.keep_alive("sensor.energy")
+    eventbus.simulate(simulate_reading)
+    interceptors = [MetricsInterceptor()]
+    if tracing.enabled():
+        interceptors.append(TracingInterceptor())
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10), interceptors=interceptors)
     energy_pb2_grpc.add_EnergyServiceServicer_to_server(EnergyService(), server)
 
     # Le serveur écoute sur le port 50052
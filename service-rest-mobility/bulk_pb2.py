@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: bulk.proto
+# Protobuf Python Version: 6.31.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    6,
+    31,
+    1,
+    '',
+    'bulk.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nbulk.proto\x12\x04\x62ulk\"z\n\nAirStation\x12\x0c\n\x04\x63ity\x18\x01 \x01(\t\x12\x0f\n\x07station\x18\x02 \x01(\t\x12\x0b\n\x03\x61qi\x18\x03 \x01(\x05\x12\x0b\n\x03\x63o2\x18\x04 \x01(\x01\x12\x0e\n\x06status\x18\x05 \x01(\t\x12\x10\n\x08latitude\x18\x06 \x01(\x01\x12\x11\n\tlongitude\x18\x07 \x01(\x01\"1\n\x0b\x41irStations\x12\"\n\x08stations\x18\x01 \x03(\x0b\x32\x10.bulk.AirStation\"s\n\rForecastPoint\x12\x15\n\rminutes_ahead\x18\x01 \x01(\x05\x12\x1b\n\x0e\x65xpected_speed\x18\x02 \x01(\x01H\x00\x88\x01\x01\x12\x1b\n\x13\x65xpected_congestion\x18\x03 \x01(\tB\x11\n\x0f_expected_speed\"\x9b\x01\n\x0bTrafficRoad\x12\x0f\n\x07road_id\x18\x01 \x01(\t\x12\x18\n\x10\x63ongestion_level\x18\x02 \x01(\t\x12\x15\n\raverage_speed\x18\x03 \x01(\x05\x12\x10\n\x08latitude\x18\x04 \x01(\x01\x12\x11\n\tlongitude\x18\x05 \x01(\x01\x12%\n\x08\x66orecast\x18\x06 \x03(\x0b\x32\x13.bulk.ForecastPoint\"0\n\x0cTrafficRoads\x12 \n\x05roads\x18\x01 \x03(\x0b\x32\x11.bulk.TrafficRoad\"\xa3\x01\n\tTransport\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x0c\n\x04type\x18\x02 \x01(\t\x12\r\n\x05ligne\x18\x03 \x01(\t\x12\x13\n\x0b\x64\x65stination\x18\x04 \x01(\t\x12\x0e\n\x06status\x18\x05 \x01(\t\x12\x15\n\x08latitude\x18\x06 \x01(\x01H\x00\x88\x01\x01\x12\x16\n\tlongitude\x18\x07 \x01(\x01H\x01\x88\x01\x01\x42\x0b\n\t_latitudeB\x0c\n\n_longitude\"1\n\nTransports\x12#\n\ntransports\x18\x01 \x03(\x0b\x32\x0f.bulk.Transportb\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'bulk_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_AIRSTATION']._serialized_start=20
+  _globals['_AIRSTATION']._serialized_end=142
+  _globals['_AIRSTATIONS']._serialized_start=144
+  _globals['_AIRSTATIONS']._serialized_end=193
+  _globals['_FORECASTPOINT']._serialized_start=195
+  _globals['_FORECASTPOINT']._serialized_end=310
+  _globals['_TRAFFICROAD']._serialized_start=313
+  _globals['_TRAFFICROAD']._serialized_end=468
+  _globals['_TRAFFICROADS']._serialized_start=470
+  _globals['_TRAFFICROADS']._serialized_end=518
+  _globals['_TRANSPORT']._serialized_start=521
+  _globals['_TRANSPORT']._serialized_end=684
+  _globals['_TRANSPORTS']._serialized_start=686
+  _globals['_TRANSPORTS']._serialized_end=735
+# @@protoc_insertion_point(module_scope)
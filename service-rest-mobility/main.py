@@ -1,10 +1,32 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
 from typing import List, Optional
+import os
+import random
 import uvicorn
 
+import bulk_pb2
+import eventbus
+import metrics
+import tracing
+
 app = FastAPI(title="Service Mobilité (REST)", version="1.0")
 
+# Métriques Prometheus sur /metrics
+app.add_middleware(metrics.AsgiMiddleware)
+
+# Traçage (activé si TRACE_SAMPLE_RATE > 0)
+tracing.init("service-rest-mobility")
+
+if tracing.enabled():
+    @app.middleware("http")
+    async def trace_requests(request, call_next):
+        span = tracing.server_span(f"{request.method} {request.url.path}", request.headers.get("traceparent"))
+        with span:
+            response = await call_next(request)
+            span.set("http.status_code", response.status_code)
+        return response
+
 # 1. Modèle de données (Pydantic)
 class Transport(BaseModel):
     id: int
@@ -12,32 +34,72 @@ class Transport(BaseModel):
     ligne: str      # "28D", "M1"
     destination: str
     status: str     # "A l'heure", "Retard"
+    latitude: Optional[float] = None   # Position de l'arrêt desservi
+    longitude: Optional[float] = None
 
 # 2. Base de données simulée (Liste en mémoire)
 # 2. Base de données simulée (Grand Tunis)
 db_transports = [
     # Banlieue Nord (Marsa / Carthage)
-    Transport(id=1, type="TGM", ligne="Nord", destination="La Marsa", status="Opérationnel"),
-    Transport(id=2, type="Bus", ligne="20b", destination="Gammarth", status="Retard 15min"),
-    Transport(id=3, type="TGM", ligne="Nord", destination="Carthage", status="A l'heure"),
+    Transport(id=1, type="TGM", ligne="Nord", destination="La Marsa", status="Opérationnel",
+              latitude=36.8782, longitude=10.3247),
+    Transport(id=2, type="Bus", ligne="20b", destination="Gammarth", status="Retard 15min",
+              latitude=36.918, longitude=10.287),
+    Transport(id=3, type="TGM", ligne="Nord", destination="Carthage", status="A l'heure",
+              latitude=36.8528, longitude=10.3233),
 
     # Centre / Banlieue Ouest (Bardo / Manouba)
-    Transport(id=4, type="Metro", ligne="4", destination="Bardo", status="A l'heure"),
-    Transport(id=5, type="Metro", ligne="4", destination="Manouba", status="Saturé"),
-    Transport(id=6, type="Bus", ligne="33", destination="Mourouj", status="Bouchons"),
+    Transport(id=4, type="Metro", ligne="4", destination="Bardo", status="A l'heure",
+              latitude=36.8092, longitude=10.1406),
+    Transport(id=5, type="Metro", ligne="4", destination="Manouba", status="Saturé",
+              latitude=36.8081, longitude=10.1011),
+    Transport(id=6, type="Bus", ligne="33", destination="Mourouj", status="Bouchons",
+              latitude=36.73, longitude=10.21),
 
     # Banlieue Sud (Rades / Hamam Lif)
-    Transport(id=7, type="Train", ligne="Banlieue", destination="Rades", status="Retard 10min"),
-    Transport(id=8, type="Train", ligne="Banlieue", destination="Hammam Lif", status="Annulé"),
+    Transport(id=7, type="Train", ligne="Banlieue", destination="Rades", status="Retard 10min",
+              latitude=36.7681, longitude=10.2753),
+    Transport(id=8, type="Train", ligne="Banlieue", destination="Hammam Lif", status="Annulé",
+              latitude=36.7297, longitude=10.3411),
 
     # Ariana / Menzah
-    Transport(id=9, type="Metro", ligne="2", destination="Ariana", status="A l'heure"),
-    Transport(id=10, type="Bus", ligne="63", destination="Menzah", status="A l'heure"),
+    Transport(id=9, type="Metro", ligne="2", destination="Ariana", status="A l'heure",
+              latitude=36.8625, longitude=10.1956),
+    Transport(id=10, type="Bus", ligne="63", destination="Menzah", status="A l'heure",
+              latitude=36.84, longitude=10.18),
 
     # Berges du Lac
-    Transport(id=11, type="Bus", ligne="28D", destination="Lac 2", status="Fluide")
+    Transport(id=11, type="Bus", ligne="28D", destination="Lac 2", status="Fluide",
+              latitude=36.845, longitude=10.27)
+]
+
+# Arrêts supplémentaires générés autour de Tunis (tests de charge, 0 par défaut)
+MOCK_EXTRA_SENSORS = int(os.getenv('MOCK_EXTRA_SENSORS', '0'))
+rng = random.Random(42)
+db_transports += [
+    Transport(id=1000 + i, type=rng.choice(["Bus", "Metro", "TGM"]), ligne=str(rng.randint(1, 99)),
+              destination=f"Arrêt {i}", status=rng.choice(["A l'heure", "Retard 5min", "Saturé"]),
+              latitude=round(36.8 + rng.uniform(-0.1, 0.1), 5), longitude=round(10.2 + rng.uniform(-0.1, 0.1), 5))
+    for i in range(MOCK_EXTRA_SENSORS)
 ]
 
+# Bus d'événements : chaque changement est publié sur "sensor.mobility" (voir eventbus.py)
+BUS = eventbus.open_bus("service-rest-mobility")
+BUS.keep_alive("sensor.mobility")
+
+
+# Export protobuf encodé une fois par version de la base (incrémentée à chaque changement)
+db_version = 0
+bulk_export = (-1, b"")
+
+
+def publish_transport(transport_id, transport):
+    # transport None = supprimé
+    global db_version
+    db_version += 1
+    BUS.publish("sensor.mobility", transport_id, transport.model_dump() if transport else None)
+
+
 # --- Opérations CRUD (Create, Read, Update, Delete) ---
 
 # READ ALL
@@ -45,6 +107,21 @@ db_transports = [
 def get_transports():
     return db_transports
 
+# EXPORT EN MASSE (protobuf, voir bulk.proto) : lu par la Gateway pour sa photo de la ville
+# Déclaré avant /transports/{transport_id} pour ne pas être pris pour un identifiant
+@app.get("/transports/bulk")
+def export_transports():
+    global bulk_export
+    version, body = bulk_export
+    if version != db_version:
+        version, message = db_version, bulk_pb2.Transports()
+        for t in db_transports:
+            message.transports.add(id=t.id, type=t.type, ligne=t.ligne, destination=t.destination, status=t.status,
+                                   latitude=t.latitude, longitude=t.longitude)
+        body = message.SerializeToString()
+        bulk_export = (version, body)
+    return Response(body, media_type="application/x-protobuf")
+
 # READ ONE
 @app.get("/transports/{transport_id}", response_model=Transport)
 def get_transport_by_id(transport_id: int):
@@ -58,16 +135,41 @@ def get_transport_by_id(transport_id: int):
 @app.post("/transports", response_model=Transport)
 def add_transport(transport: Transport):
     db_transports.append(transport)
+    publish_transport(transport.id, transport)
     return transport
 
+# UPDATE (ex: nouveau statut remonté par le réseau)
+@app.put("/transports/{transport_id}", response_model=Transport)
+def update_transport(transport_id: int, transport: Transport):
+    for i, t in enumerate(db_transports):
+        if t.id == transport_id:
+            db_transports[i] = transport.model_copy(update={"id": transport_id})
+            publish_transport(transport_id, db_transports[i])
+            return db_transports[i]
+    raise HTTPException(status_code=404, detail="Transport non trouvé")
+
 # DELETE
 @app.delete("/transports/{transport_id}")
 def delete_transport(transport_id: int):
     global db_transports
     # On garde tous les transports SAUF celui qu'on veut supprimer
     db_transports = [t for t in db_transports if t.id != transport_id]
+    publish_transport(transport_id, None)
     return {"message": "Transport supprimé"}
 
+
+# Capteurs simulés (SENSOR_UPDATES_PER_S) : un transport change de statut
+STATUSES = ["A l'heure", "Retard 5min", "Retard 15min", "Saturé", "Opérationnel"]
+
+
+def simulate_status():
+    i = random.randrange(len(db_transports))
+    db_transports[i] = db_transports[i].model_copy(update={"status": random.choice(STATUSES)})
+    publish_transport(db_transports[i].id, db_transports[i])
+
+
+eventbus.simulate(simulate_status)
+
 if __name__ == "__main__":
     print("Démarrage du service REST sur le port 8002...")
     uvicorn.run(app, host="0.0.0.0", port=8002)
\ No newline at end of file
@@ -1,22 +1,105 @@
 import logging
+import os
+import random
+import time
 # On utilise wsgiref pour créer un serveur web simple
 from wsgiref.simple_server import make_server
 
 # Importations de Spyne (la librairie SOAP)
-from spyne import Application, rpc, ServiceBase, Integer, Unicode, Float, ComplexModel
+from spyne import Application, rpc, ServiceBase, Integer, Unicode, Float, ComplexModel, Array, Fault
 from spyne.protocol.soap import Soap11
 from spyne.server.wsgi import WsgiApplication
 
+import bulk_pb2
+import eventbus
+import metrics
+import tracing
+
 # Configuration des logs pour voir les erreurs
 logging.basicConfig(level=logging.DEBUG)
 
 
+# Petite base de données simulée (avec la position GPS de chaque station)
+city_db = {
+    "Tunis": {"aqi": 55, "co2": 410.5, "status": "Moyen", "lat": 36.8008, "lon": 10.1800},
+    "Marsa": {"aqi": 25, "co2": 380.0, "status": "Excellent", "lat": 36.8782, "lon": 10.3247},
+    "Carthage": {"aqi": 30, "co2": 385.2, "status": "Bon", "lat": 36.8528, "lon": 10.3233},
+    "Bardo": {"aqi": 110, "co2": 500.1, "status": "Pollué", "lat": 36.8092, "lon": 10.1406},
+    "Sfax": {"aqi": 140, "co2": 600.0, "status": "Très Pollué", "lat": 34.7406, "lon": 10.7603},
+}
+
+
+# Stations supplémentaires générées autour de Tunis (tests de charge, 0 par défaut)
+MOCK_EXTRA_SENSORS = int(os.getenv('MOCK_EXTRA_SENSORS', '0'))
+rng = random.Random(42)
+for i in range(MOCK_EXTRA_SENSORS):
+    aqi = rng.randint(10, 150)
+    city_db[f"Station {i}"] = {"aqi": aqi, "co2": round(rng.uniform(370, 600), 1), "status": "Moyen",
+                               "lat": round(36.8 + rng.uniform(-0.1, 0.1), 5),
+                               "lon": round(10.2 + rng.uniform(-0.1, 0.1), 5)}
+
+# Bus d'événements : chaque nouveau relevé est publié sur "sensor.air" (voir eventbus.py)
+BUS = eventbus.open_bus("service-soap-air")
+BUS.keep_alive("sensor.air")
+
+# AQI -> état (mêmes libellés que la base)
+AQI_LEVELS = ((25, "Excellent"), (50, "Bon"), (100, "Moyen"), (130, "Pollué"))
+
+
+def air_status(aqi):
+    for limit, label in AQI_LEVELS:
+        if aqi <= limit:
+            return label
+    return "Très Pollué"
+
+
 # Modèle de données : À quoi ressemble une "Réponse Air" ?
 class AirData(ComplexModel):
     station = Unicode
+    city = Unicode  # Clé de la station (à renvoyer à get_air_quality)
     aqi = Integer  # Air Quality Index
     co2 = Float  # Niveau CO2
     status = Unicode  # "Bon", "Moyen", "Dangereux"
+    latitude = Float
+    longitude = Float
+
+
+def make_air_data(key, data, city=None):
+    return AirData(
+        station=f"Capteur {city or key}",
+        city=key,
+        aqi=data['aqi'],
+        co2=data['co2'],
+        status=data['status'],
+        latitude=data['lat'],
+        longitude=data['lon']
+    )
+
+
+# Export protobuf encodé une fois par version de la base (incrémentée à chaque relevé)
+db_version = 0
+bulk_export = (-1, b"")
+
+
+def record_reading(key, aqi, co2, status=None):
+    global db_version
+    data = city_db[key]
+    data.update(aqi=aqi, co2=co2, status=status or air_status(aqi))
+    db_version += 1
+    air = make_air_data(key, data)
+    BUS.publish("sensor.air", key, {name: getattr(air, name) for name in (
+        "station", "city", "aqi", "co2", "status", "latitude", "longitude")})
+    return air
+
+
+# Capteurs simulés (SENSOR_UPDATES_PER_S) : l'AQI d'une station varie un peu
+def simulate_reading():
+    key = random.choice(list(city_db))
+    data = city_db[key]
+    record_reading(key, max(0, data['aqi'] + random.randint(-5, 5)), round(data['co2'] + random.uniform(-3, 3), 1))
+
+
+eventbus.simulate(simulate_reading)
 
 
 # Définition du Service (La logique métier)
@@ -25,37 +108,33 @@ class AirQualityService(ServiceBase):
     def get_air_quality(ctx, city):
         print(f"Demande reçue pour la ville : {city}")
 
-        # Petite base de données simulée
-        city_db = {
-            "Tunis": {"aqi": 55, "co2": 410.5, "status": "Moyen"},
-            "Marsa": {"aqi": 25, "co2": 380.0, "status": "Excellent"},
-            "Carthage": {"aqi": 30, "co2": 385.2, "status": "Bon"},
-            "Bardo": {"aqi": 110, "co2": 500.1, "status": "Pollué"},
-            "Sfax": {"aqi": 140, "co2": 600.0, "status": "Très Pollué"},
-        }
-
         # On cherche la ville (en ignorant majuscules/minuscules)
-        data = None
+        for key, data in city_db.items():
+            if key.lower() == city.lower():
+                return make_air_data(key, data, city)
+
+        # Valeur par défaut si ville inconnue
+        return AirData(
+            station="Inconnue",
+            aqi=0,
+            co2=0.0,
+            status="Données non disponibles"
+        )
+
+    # Nouveau relevé envoyé par un capteur (état déduit de l'AQI si absent)
+    @rpc(Unicode, Integer, Float, Unicode, _returns=AirData)
+    def update_air_quality(ctx, city, aqi, co2, status):
         for key in city_db:
             if key.lower() == city.lower():
                 data = city_db[key]
-                break
-
-        if data:
-            return AirData(
-                station=f"Capteur {city}",
-                aqi=data['aqi'],
-                co2=data['co2'],
-                status=data['status']
-            )
-        else:
-            # Valeur par défaut si ville inconnue
-            return AirData(
-                station="Inconnue",
-                aqi=0,
-                co2=0.0,
-                status="Données non disponibles"
-            )
+                return record_reading(key, data['aqi'] if aqi is None else aqi, data['co2'] if co2 is None else co2,
+                                      status)
+        raise Fault(faultcode="Client", faultstring=f"Station inconnue : {city}")
+
+    # Liste de toutes les stations (utilisée par la Gateway pour l'index géographique)
+    @rpc(_returns=Array(AirData))
+    def list_stations(ctx):
+        return [make_air_data(city, data) for city, data in city_db.items()]
 
 # Création de l'application SOAP
 application = Application(
@@ -65,8 +144,57 @@ application = Application(
     out_protocol=Soap11()
 )
 
-# Transformation en application Web WSGI
-wsgi_application = WsgiApplication(application)
+# Traçage : durée de la méthode et de la sérialisation XML (événements Spyne)
+tracing.init("service-soap-air")
+
+
+def _on_method_call(ctx):
+    ctx.udc = {"call_ns": time.time_ns()}
+
+
+def _on_method_return(ctx):
+    if ctx.udc:
+        ctx.udc["return_ns"] = time.time_ns()
+        tracing.record(f"soap.method {ctx.method_request_string}", ctx.udc["call_ns"], ctx.udc["return_ns"])
+
+
+def _on_serialized(ctx):
+    if ctx.udc and "return_ns" in ctx.udc:
+        tracing.record("soap.serialize", ctx.udc["return_ns"], time.time_ns())
+
+
+if tracing.enabled():
+    application.event_manager.add_listener('method_call', _on_method_call)
+    application.event_manager.add_listener('method_return_object', _on_method_return)
+    application.event_manager.add_listener('method_return_string', _on_serialized)
+
+# Export en masse (protobuf, voir bulk.proto) : lu par la Gateway pour sa photo de la ville,
+# sans passer par l'enveloppe XML
+def export_stations(environ, start_response):
+    global bulk_export
+    version, body = bulk_export
+    if version != db_version:
+        version, message = db_version, bulk_pb2.AirStations()
+        for key, data in list(city_db.items()):
+            message.stations.add(city=key, station=f"Capteur {key}", aqi=data['aqi'], co2=data['co2'],
+                                 status=data['status'], latitude=data['lat'], longitude=data['lon'])
+        body = message.SerializeToString()
+        bulk_export = (version, body)
+    start_response("200 OK", [("Content-Type", "application/x-protobuf"), ("Content-Length", str(len(body)))])
+    return [body]
+
+
+def with_bulk_export(soap_app):
+    def dispatch(environ, start_response):
+        if environ.get('PATH_INFO') == '/bulk/air':
+            return export_stations(environ, start_response)
+        return soap_app(environ, start_response)
+    return dispatch
+
+
+# Transformation en application Web WSGI (+ métriques Prometheus sur /metrics)
+wsgi_application = metrics.WsgiMiddleware(tracing.WsgiMiddleware(with_bulk_export(WsgiApplication(application))),
+                                          routes=("/", "/bulk/air"))
 
 if __name__ == '__main__':
     port = 8001
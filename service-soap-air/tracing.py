@@ -0,0 +1,333 @@
+"""Traçage léger des requêtes (spans) entre la Gateway et les services.
+
+Copie identique dans chaque service (comme energy_pb2.py), sans dépendance
+externe. Le contexte voyage dans l'en-tête W3C `traceparent` (HTTP) ou dans la
+métadonnée gRPC du même nom.
+
+Configuration par variables d'environnement :
+    TRACE_SAMPLE_RATE  proportion de requêtes tracées (0 = désactivé, défaut)
+    TRACE_FILE         fichier JSON lines où écrire les spans (défaut : traces.jsonl)
+    TRACE_OTLP_URL     collecteur OTLP/HTTP JSON (ex: http://127.0.0.1:4318/v1/traces)
+    TRACE_QUEUE_MAX    spans en attente d'export au plus (au-delà : comptés et jetés)
+
+Désactivé, un span() coûte une lecture de contextvar et renvoie un objet vide.
+"""
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+SAMPLE_RATE = float(os.getenv('TRACE_SAMPLE_RATE', '0'))
+TRACE_FILE = os.getenv('TRACE_FILE', 'traces.jsonl')
+OTLP_URL = os.getenv('TRACE_OTLP_URL')
+QUEUE_MAX = int(os.getenv('TRACE_QUEUE_MAX', '65536'))
+
+SERVICE_NAME = "unknown"
+
+_current = contextvars.ContextVar("current_span", default=None)
+_exporter = None
+
+
+class _NoopSpan:
+    """Renvoyé quand la requête n'est pas tracée : ne fait rien, ne coûte rien."""
+    trace_id = None
+    sampled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key, value):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+class _UnsampledSpan(_NoopSpan):
+    """Trace non tirée au sort : rien n'est enregistré, mais les appels sortants portent
+    un traceparent aux flags 00 pour que les services ne tirent pas leur propre trace."""
+
+    def __init__(self, trace_id, span_id):
+        self.traceparent = f"00-{trace_id}-{span_id}-00"
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        return False
+
+
+class Span:
+    sampled = True
+
+    def __init__(self, name, trace_id, parent_id=None, kind="internal", attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.error = None
+        self.start_ns = None
+        self.end_ns = None
+        self._token = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _export(self)
+        return False
+
+    @property
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": SERVICE_NAME,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+# --- 1. API ---
+def init(service_name):
+    """À appeler au démarrage du service (nomme les spans et lance l'export)."""
+    global SERVICE_NAME, _exporter
+    SERVICE_NAME = service_name
+    if SAMPLE_RATE > 0 and _exporter is None:
+        _exporter = _Exporter(TRACE_FILE, OTLP_URL)
+
+
+def enabled():
+    return SAMPLE_RATE > 0
+
+
+def current():
+    """Span enregistré en cours, ou None (requête non tracée ou non tirée au sort)."""
+    s = _current.get()
+    return s if s is not None and s.sampled else None
+
+
+def server_span(name, traceparent=None, **attributes):
+    """Span racine d'une requête reçue : suit la décision de l'appelant (flags) ou tire au sort."""
+    parent = parse_traceparent(traceparent) if traceparent else None
+    if parent:
+        trace_id, parent_id, sampled = parent
+        if not sampled:
+            return _UnsampledSpan(trace_id, parent_id)
+        return Span(name, trace_id, parent_id, kind="server", attributes=attributes)
+    return _new_trace(name, "server", attributes)
+
+
+def background_span(name, **attributes):
+    """Span d'une tâche de fond : enfant du contexte courant s'il y en a un, sinon nouvelle trace."""
+    if _current.get() is not None:
+        return span(name, **attributes)
+    return _new_trace(name, "internal", attributes)
+
+
+def _new_trace(name, kind, attributes):
+    if SAMPLE_RATE <= 0:
+        return NOOP
+    trace_id = f"{random.getrandbits(128):032x}"
+    if random.random() >= SAMPLE_RATE:
+        return _UnsampledSpan(trace_id, f"{random.getrandbits(64):016x}")
+    return Span(name, trace_id, kind=kind, attributes=attributes)
+
+
+def span(name, kind="internal", **attributes):
+    """Span enfant du span courant (ou rien si la requête n'est pas tracée)."""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return NOOP
+    return Span(name, parent.trace_id, parent.span_id, kind=kind, attributes=attributes)
+
+
+def record(name, start_ns, end_ns, **attributes):
+    """Enregistre après coup un span mesuré à la main (ex: événements Spyne)."""
+    parent = _current.get()
+    if parent is None or not parent.sampled:
+        return
+    s = Span(name, parent.trace_id, parent.span_id, attributes=attributes)
+    s.start_ns, s.end_ns = start_ns, end_ns
+    _export(s)
+
+
+def headers(extra=None):
+    """En-têtes HTTP à ajouter à un appel sortant pour propager la trace (même non tirée au sort)."""
+    result = dict(extra or {})
+    s = _current.get()
+    if s is not None:
+        result["traceparent"] = s.traceparent
+    return result
+
+
+def grpc_metadata():
+    s = _current.get()
+    return (("traceparent", s.traceparent),) if s is not None else ()
+
+
+def parse_traceparent(value):
+    try:
+        version, trace_id, parent_id, flags = value.strip().split("-")
+        int(trace_id, 16), int(parent_id, 16)
+        return trace_id, parent_id, bool(int(flags, 16) & 1)
+    except (ValueError, AttributeError):
+        return None
+
+
+# --- 2. MIDDLEWARE WSGI (Flask, Spyne) ---
+class WsgiMiddleware:
+    """Ouvre un span serveur par requête WSGI, jusqu'à la fin de l'envoi de la réponse."""
+
+    def __init__(self, app, name=None):
+        self.app = app
+        self.name = name
+
+    def __call__(self, environ, start_response):
+        s = server_span(self.name or f"{environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}",
+                        environ.get("HTTP_TRACEPARENT"),
+                        **{"http.method": environ.get("REQUEST_METHOD"), "http.path": environ.get("PATH_INFO")})
+        if not s.sampled:
+            with s:
+                return self.app(environ, start_response)
+
+        s.__enter__()
+        try:
+            body = self.app(environ, start_response)
+            # On consomme la réponse ici pour que la sérialisation soit dans le span
+            chunks = list(body)
+            if hasattr(body, "close"):
+                body.close()
+        except BaseException as e:
+            s.__exit__(type(e), e, None)
+            raise
+        s.set("http.response_bytes", sum(len(c) for c in chunks))
+        s.__exit__(None, None, None)
+        return chunks
+
+
+# --- 3. EXPORT EN ARRIÈRE-PLAN ---
+def _export(s):
+    if _exporter is not None:
+        _exporter.put(s.to_dict())
+
+
+class _Exporter:
+    """Regroupe les spans et les écrit (fichier et/ou OTLP) depuis un thread dédié.
+
+    File bornée (max_queue) : si l'export ne suit pas, les spans en trop sont comptés et
+    jetés au lieu de remplir la mémoire. Une erreur d'écriture est signalée, le thread continue.
+    """
+
+    def __init__(self, path, otlp_url, batch=256, flush_s=1.0, max_queue=QUEUE_MAX):
+        self.path = path
+        self.otlp_url = otlp_url
+        self.batch = batch
+        self.flush_s = flush_s
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.drop_lock = threading.Lock()
+        # Thread d'export et atexit : un seul flush à la fois
+        self.lock = threading.Lock()
+        threading.Thread(target=self._loop, daemon=True, name="trace-exporter").start()
+        atexit.register(self.flush)
+
+    def put(self, span):
+        try:
+            self.queue.put_nowait(span)
+        except queue.Full:
+            with self.drop_lock:
+                self.dropped += 1
+
+    def _loop(self):
+        while True:
+            time.sleep(self.flush_s)
+            self.flush()
+
+    def flush(self):
+        """Vide toute la file, par paquets de batch * 16 spans."""
+        with self.lock:
+            while True:
+                spans = []
+                while len(spans) < self.batch * 16:
+                    try:
+                        spans.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+                if spans:
+                    self._write(spans)
+                if len(spans) < self.batch * 16:
+                    break
+            with self.drop_lock:
+                dropped, self.dropped = self.dropped, 0
+        if dropped:
+            print(f"⚠️ Traces : {dropped} span(s) perdu(s), file d'export pleine (TRACE_QUEUE_MAX={self.queue.maxsize})")
+
+    def _write(self, spans):
+        try:
+            if self.path:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(s, ensure_ascii=False, default=str) + "\n" for s in spans))
+            if self.otlp_url:
+                for i in range(0, len(spans), self.batch):
+                    self._post_otlp(spans[i:i + self.batch])
+        except Exception as e:
+            print(f"⚠️ Export de {len(spans)} span(s) impossible : {e}")
+
+    def _post_otlp(self, spans):
+        kinds = {"internal": 1, "server": 2, "client": 3}
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{
+                "scope": {"name": "smartcity.tracing"},
+                "spans": [{
+                    "traceId": s["trace_id"],
+                    "spanId": s["span_id"],
+                    "parentSpanId": s["parent_id"] or "",
+                    "name": s["name"],
+                    "kind": kinds.get(s["kind"], 1),
+                    "startTimeUnixNano": str(s["start_ns"]),
+                    "endTimeUnixNano": str(s["end_ns"]),
+                    "attributes": [{"key": k, "value": {"stringValue": str(v)}}
+                                   for k, v in s["attributes"].items()],
+                    "status": {"code": 2, "message": s["error"]} if s["error"] else {"code": 1},
+                } for s in spans],
+            }],
+        }]}
+        req = urllib.request.Request(self.otlp_url, data=json.dumps(payload).encode(),
+                                     headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(req, timeout=2).close()
+        except Exception as e:
+            print(f"⚠️ Export des traces impossible ({self.otlp_url}) : {e}")